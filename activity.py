@@ -0,0 +1,185 @@
+# activity.py
+# Per-channel activity model for autonomous replies. Every message seen in a
+# channel updates, in O(1) (amortized for the participant window):
+#   - rate: human messages per minute, exponentially decayed (RATE_TAU)
+#   - participants: distinct humans who spoke in the last PARTICIPANT_WINDOW
+#   - reception: decayed share of persona replies a human answered within ANSWER_WINDOW
+# A persona's reply probability (base_prob plus its bonuses) is scaled down in
+# busy channels and up in quiet ones, raised a little for crowded and receptive
+# channels, and multiplied by one process-wide factor that steers the autoreply
+# rate toward `budget` replies per minute. Cooldowns stretch with the
+# channel's rate and while over budget.
+# replay.py runs recorded traffic (TraceWriter output) through the same model.
+import json
+import math
+from collections import OrderedDict
+
+from quota import REQUESTS_PER_MIN
+
+BUDGET_SHARE = 0.5          # default budget: this share of GEMINI_RPM for autonomous replies
+RATE_TAU = 300              # seconds, time constant of the message rate
+PARTICIPANT_WINDOW = 600    # seconds a human counts as participating
+MAX_PARTICIPANTS = 64       # authors remembered per channel
+ANSWER_WINDOW = 120         # seconds after a persona reply in which a human message answers it
+RECEPTION_TAU = 1800
+REFERENCE_RATE = 2.0        # human messages per minute at which base_prob applies unchanged
+BUSY_MIN, BUSY_MAX = 0.2, 3.0
+CROWD_BONUS = 0.1           # per participant beyond the first ...
+CROWD_MAX = 5               # ... counting at most this many
+PROB_MAX = 0.8
+BUDGET_TAU = 120            # seconds, time constant of the measured autoreply rate
+STEER_INTERVAL = 10         # seconds between adjustments of the budget factor
+STEER_GAIN = 0.25
+SCALE_MIN, SCALE_MAX = 0.05, 2.0
+COOLDOWN_MIN, COOLDOWN_MAX = 0.5, 4.0   # bounds of the cooldown multiplier
+MAX_CHANNELS = 10000
+
+
+def _clamp(x, lo, hi):
+    return lo if x < lo else hi if x > hi else x
+
+
+class Decayed:
+    # exponentially decayed event count; a steady rate r per second settles at r * tau
+    __slots__ = ("value", "updated", "since")
+
+    def __init__(self):
+        self.value = 0.0
+        self.updated = None
+        self.since = None   # first event
+
+    def rate(self, now, tau):
+        # events per second, corrected for the count still warming up after `since`;
+        # the correction stops at one tau, so a first event reads as 1/(0.63 tau), not a burst
+        if self.updated is None:
+            return 0.0
+        warm = 1 - math.exp(-max(now - self.since, tau) / tau)
+        return self.at(now, tau) / (tau * warm)
+
+    def at(self, now, tau):
+        if self.updated is None:
+            return 0.0
+        return self.value * math.exp(-max(0.0, now - self.updated) / tau)
+
+    def add(self, n, now, tau):
+        if self.since is None:
+            self.since = now
+        self.value = self.at(now, tau) + n
+        self.updated = now
+
+
+class ChannelActivity:
+    __slots__ = ("messages", "authors", "replies", "answered", "awaiting")
+
+    def __init__(self):
+        self.messages = Decayed()
+        self.authors = OrderedDict()  # human author id -> last message ts, oldest first
+        self.replies = Decayed()
+        self.answered = Decayed()
+        self.awaiting = None          # ts of the latest persona reply no human has answered yet
+
+    def human(self, author_id, now):
+        self.messages.add(1, now, RATE_TAU)
+        authors = self.authors
+        authors[author_id] = now
+        authors.move_to_end(author_id)
+        if len(authors) > MAX_PARTICIPANTS:
+            authors.popitem(last=False)
+        if self.awaiting is not None:
+            if now - self.awaiting <= ANSWER_WINDOW:
+                self.answered.add(1, now, RECEPTION_TAU)
+            self.awaiting = None
+
+    def persona(self, now):
+        self.replies.add(1, now, RECEPTION_TAU)
+        self.awaiting = now
+
+    def rate(self, now):
+        # human messages per minute
+        return self.messages.rate(now, RATE_TAU) * 60
+
+    def participants(self, now):
+        authors = self.authors
+        while authors and now - next(iter(authors.values())) > PARTICIPANT_WINDOW:
+            authors.popitem(last=False)
+        return len(authors)
+
+    def reception(self, now):
+        # answered share with one answered and one ignored reply as the prior
+        return (self.answered.at(now, RECEPTION_TAU) + 1) / (self.replies.at(now, RECEPTION_TAU) + 2)
+
+
+class ActivityModel:
+    def __init__(self, budget=None):
+        self.budget = budget or REQUESTS_PER_MIN * BUDGET_SHARE   # autoreplies per minute
+        self._channels = OrderedDict()   # channel_id -> ChannelActivity, LRU
+        self.spent = Decayed()
+        self.scale = 1.0
+        self._steered = None
+
+    def __len__(self):
+        return len(self._channels)
+
+    def channel(self, channel_id):
+        ch = self._channels.get(channel_id)
+        if ch is None:
+            ch = self._channels[channel_id] = ChannelActivity()
+            if len(self._channels) > MAX_CHANNELS:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel_id)
+        return ch
+
+    def observe(self, channel_id, author_id, persona, now):
+        # persona: the message is a persona reply (ours or another process's)
+        ch = self.channel(channel_id)
+        if persona:
+            ch.persona(now)
+        else:
+            ch.human(author_id, now)
+
+    def spend(self, now):
+        # one autonomous reply taken, anywhere in the process
+        self.spent.add(1, now, BUDGET_TAU)
+        self._steer(now)
+
+    def spend_rate(self, now):
+        return self.spent.rate(now, BUDGET_TAU) * 60
+
+    def _steer(self, now):
+        if self._steered is not None and now - self._steered < STEER_INTERVAL:
+            return
+        self._steered = now
+        ratio = self.budget / max(self.spend_rate(now), self.budget * 0.1)
+        self.scale = _clamp(self.scale * ratio ** STEER_GAIN, SCALE_MIN, SCALE_MAX)
+
+    def reply_prob(self, prob, channel_id, now):
+        # prob: the persona's own reply probability for this message, bonuses included
+        self._steer(now)
+        ch = self.channel(channel_id)
+        busy = _clamp(REFERENCE_RATE / max(ch.rate(now), 1e-6), BUSY_MIN, BUSY_MAX)
+        crowd = 1 + CROWD_BONUS * _clamp(ch.participants(now) - 1, 0, CROWD_MAX)
+        received = 0.5 + ch.reception(now)
+        return min(PROB_MAX, prob * busy * crowd * received * self.scale)
+
+    def cooldown(self, persona, channel_id, now):
+        ch = self.channel(channel_id)
+        factor = math.sqrt(ch.rate(now) / REFERENCE_RATE) / min(1.0, self.scale)
+        return persona.cooldown * _clamp(factor, COOLDOWN_MIN, COOLDOWN_MAX)
+
+    def stats(self, now):
+        return {"channels": len(self._channels), "scale": round(self.scale, 3),
+                "spend_per_min": round(self.spend_rate(now), 3), "budget_per_min": self.budget}
+
+
+class TraceWriter:
+    # ACTIVITY_TRACE=path.jsonl: one line per message for replay.py (no message text)
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, ts, channel_id, author_id, persona):
+        self._file.write(json.dumps({"ts": round(ts, 3), "channel": channel_id,
+                                     "author": author_id, "persona": persona}) + "\n")
+
+    def close(self):
+        self._file.close()
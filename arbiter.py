@@ -0,0 +1,75 @@
+# arbiter.py
+# Turn arbitration: instead of every persona rolling its own base_prob for
+# each user message (up to four generations per message), the runtime asks
+# the arbiter once per message which personas may reply. Each persona still
+# rolls its base_prob (+bot_bonus), raised by how well the message matches its
+# traits; of those that want the turn, at most `max_replies` get it, most
+# relevant first. Mentioned personas always answer and use up turns.
+import re
+import random
+import unicodedata
+
+TRAIT_BONUS = 0.15        # added to the reply probability per matching trait
+TRAIT_BONUS_MAX = 0.45
+MAX_TURN_REPLIES = 1      # default autonomous replies per user message
+
+
+def _norm(text):
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _matcher(traits):
+    # -> (regex for ASCII traits or None, CJK traits). ASCII traits must stand as words
+    # ("ai" not in "said"); lookarounds instead of \b so "aiについて" still matches.
+    # CJK traits are plain substrings (no spaces between words).
+    words = [t for t in traits if t.isascii()]
+    rx = None
+    if words:
+        alt = "|".join(map(re.escape, sorted(words, key=len, reverse=True)))
+        rx = re.compile(rf"(?<![a-z0-9])(?:{alt})(?![a-z0-9])")
+    return rx, [t for t in traits if not t.isascii()]
+
+
+class TurnArbiter:
+    def __init__(self, max_replies=MAX_TURN_REPLIES, rng=None):
+        self.max_replies = max_replies
+        self.rng = rng or random
+        self._traits = {}  # persona role -> (ASCII trait regex, CJK traits), normalized
+        self.stats = {"messages": 0, "candidates": 0, "dispatched": 0, "dropped": 0}
+
+    def relevance(self, persona, text):
+        # number of the persona's traits the message mentions
+        traits = self._traits.get(persona.role)
+        if traits is None:
+            traits = self._traits[persona.role] = _matcher([_norm(t) for t in persona.traits])
+        rx, cjk = traits
+        return (len(set(rx.findall(text))) if rx is not None else 0) + sum(t in text for t in cjk)
+
+    def choose(self, text, bots, mentions, other_bot_spoke, adjust=None):
+        # bots: unmentioned bots free to reply in the channel; mentions: how many were
+        # mentioned; other_bot_spoke(bot) -> bool; adjust(bot, prob) -> prob, applied
+        # after the bonuses (e.g. the activity model). Returns the bots given a turn.
+        self.stats["messages"] += 1
+        turns = self.max_replies - mentions
+        if turns <= 0 or not bots:
+            return set()
+        text = _norm(text)
+        wanting = []
+        for bot in bots:
+            p = bot.persona
+            score = self.relevance(p, text)
+            prob = p.base_prob + min(TRAIT_BONUS_MAX, TRAIT_BONUS * score)
+            if other_bot_spoke(bot):
+                prob += p.bot_bonus
+            if adjust is not None:
+                prob = adjust(bot, prob)
+            roll = self.rng.random()
+            if roll < prob:
+                # most relevant first; among equals, whoever wanted it most
+                wanting.append((score, prob - roll, bot))
+        wanting.sort(key=lambda w: (w[0], w[1]), reverse=True)
+        chosen = {bot for _, _, bot in wanting[:turns]}
+        self.stats["candidates"] += len(wanting)
+        self.stats["dispatched"] += len(chosen)
+        self.stats["dropped"] += len(wanting) - len(chosen)
+        return chosen
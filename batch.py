@@ -0,0 +1,201 @@
+# batch.py
+# Single-call multi-persona generation. Personas that reply to the same text
+# in the same channel within BATCH_WINDOW seconds (several mentions, several
+# arbiter turns, overlapping bursts) share one Gemini request: the shared
+# history is sent once and the model answers for every persona as JSON.
+# Replies are posted in the order the model wrote them. Personas missing from
+# the answer (or all of them, when the JSON does not parse) fall back to their
+# own generate() call; quota errors fail the batch instead of multiplying it.
+import json
+import time
+import asyncio
+
+from metrics import METRICS
+from prompt import HISTORY_HEADER, SUMMARY_HEADER, estimate_tokens
+from quota import QuotaExceeded, is_quota_error
+from resilience import DEADLINE
+
+BATCH_WINDOW = 0.3    # seconds to wait for other personas answering the same message
+TURN_WAIT = 30        # seconds a reply waits for the one before it in the batch to be posted
+PERSONA_LIST = "出力するpersona: "  # parsed by fakes.StubModel
+
+
+def build_prompt(bots, hist, user_text, summary=None):
+    # returns (prompt, estimated tokens)
+    parts = ["以下の登場人物それぞれとして、同じ会話に続けて返答してください。\n"]
+    for bot in bots:
+        p = bot.persona
+        parts += [f"\n## {p.name} (persona: {p.role})\n", p.prompt, "\n返答の方針: ",
+                  bot.prompt_builder.instruction, "\n"]
+    builder = max((b.prompt_builder for b in bots), key=lambda b: b.history_tokens)
+    roles = [b.persona.role for b in bots]
+    if summary is not None:
+        parts += [SUMMARY_HEADER, summary.text]
+    lines, _ = builder.history(hist, summary and summary.through)
+    parts += [HISTORY_HEADER, *lines, "\n新しいユーザー発言: ", user_text, "\n\n",
+              PERSONA_LIST, ", ".join(roles), "\n",
+              "次の形式のJSONだけを出力してください（前置きやコードブロックは不要）:\n",
+              '{"replies": [{"persona": "', roles[0], '", "text": "返答本文"}, ...]}\n',
+              "各personaちょうど1件ずつ、上の順で。後の人物は前の人物の返答を踏まえて構いません。"
+              "本文に名前の見出しは付けないでください。"]
+    prompt = "".join(parts)
+    return prompt, estimate_tokens(prompt)
+
+
+def parse_replies(text, roles):
+    # role -> reply text for every valid entry, in the order the model wrote them
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    items = data.get("replies") if isinstance(data, dict) else data
+    out = {}
+    if not isinstance(items, list):
+        return out
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        role, reply = item.get("persona"), item.get("text")
+        if role in roles and role not in out and isinstance(reply, str) and reply.strip():
+            out[role] = reply.strip()
+    return out
+
+
+class Turn:
+    # async context around a post: waits until the previous reply of the batch is out
+    def __init__(self, after=None):
+        self.after = after
+        self.done = asyncio.Event()
+
+    async def __aenter__(self):
+        if self.after is not None:
+            try:
+                await asyncio.wait_for(self.after.done.wait(), TURN_WAIT)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self.done.set()
+                raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self.done.set()
+
+
+class Batch:
+    __slots__ = ("channel_id", "text", "members", "created")
+
+    def __init__(self, channel_id, text):
+        self.channel_id = channel_id
+        self.text = text
+        self.members = []   # (bot, priority, future)
+        self.created = time.monotonic()
+
+
+class TurnBatcher:
+    def __init__(self, runtime, window=BATCH_WINDOW):
+        self.runtime = runtime
+        self.window = window
+        self._open = {}     # (channel_id, text) -> Batch collecting members
+        self._tasks = set()
+        self.stats = {"batches": 0, "batched_replies": 0, "single": 0, "fallbacks": 0, "parse_failures": 0}
+
+    async def generate(self, bot, channel_id, user_text, priority):
+        # returns (reply, Turn or None); raises what bot.generate would
+        key = (channel_id, user_text)
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = Batch(channel_id, user_text)
+            asyncio.get_running_loop().call_later(self.window, self._fire, key)
+        fut = asyncio.get_running_loop().create_future()
+        batch.members.append((bot, priority, fut))
+        return await fut
+
+    def _fire(self, key):
+        batch = self._open.pop(key)
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        by_role = {}  # one seat per persona; a repeat request is served on its own
+        extra = []
+        for m in batch.members:
+            if m[2].done():
+                continue  # cancelled while waiting (e.g. superseded burst)
+            if m[0].persona.role in by_role:
+                extra.append(m)
+            else:
+                by_role[m[0].persona.role] = m
+        members = list(by_role.values())
+        if len(members) <= 1:
+            self.stats["single"] += len(members)
+            await asyncio.gather(*(self._single(batch, *m, None) for m in members + extra))
+            return
+        bots = [bot for bot, _, _ in members]
+        try:
+            replies = await self._request(batch, bots, min(p for _, p, _ in members))
+        except Exception as e:
+            if is_quota_error(e) or isinstance(e, QuotaExceeded):
+                error = bots[0].api_error(e)
+                for _, _, fut in members + extra:
+                    if not fut.done():
+                        fut.set_exception(error)
+                return
+            print(f"Batch generation failed: {type(e).__name__}: {e}")
+            replies = {}
+
+        order = [by_role[r] for r in replies] + [m for m in members if m[0].persona.role not in replies]
+        turn = None
+        fallbacks = []
+        for bot, priority, fut in order:
+            turn = Turn(turn)
+            reply = replies.get(bot.persona.role)
+            if reply is None:
+                fallbacks.append(self._single(batch, bot, priority, fut, turn))
+            elif fut.done():
+                turn.done.set()  # its bot gave up waiting; do not hold up the rest
+            else:
+                fut.set_result((reply, turn))
+        fallbacks += [self._single(batch, *m, None) for m in extra]
+        self.stats["batches"] += 1
+        self.stats["batched_replies"] += len(replies)
+        self.stats["fallbacks"] += len(fallbacks)
+        METRICS.inc("batch_replies_total", len(replies), outcome="batched")
+        METRICS.inc("batch_replies_total", len(fallbacks), outcome="fallback")
+        await asyncio.gather(*fallbacks)
+
+    async def _request(self, batch, bots, priority):
+        lead = bots[0]
+        roles = [bot.persona.role for bot in bots]
+        hist = self.runtime.recent(batch.channel_id, max(bot.persona.history_size for bot in bots))
+        prompt, tokens = build_prompt(bots, hist, batch.text, self.runtime.summary(batch.channel_id))
+        METRICS.observe("batch_size", len(bots), (2, 3, 4, 6, 8))
+        # the lead's request path: quota, retries and hedging within the priority's
+        # deadline (counted from when the batch opened), breaker and latency tracking
+        deadline = batch.created + DEADLINE[priority]
+        resp = await lead.call(lambda timeout: lead.generator.generate(prompt, timeout), tokens, priority,
+                               deadline, label="batch")
+        replies = parse_replies(getattr(resp, "text", ""), roles)
+        if len(replies) < len(roles):
+            self.stats["parse_failures"] += 1
+            print(f"Batch reply covered {sorted(replies)} of {roles}; falling back for the rest")
+        return replies
+
+    async def _single(self, batch, bot, priority, fut, turn):
+        try:
+            reply = await bot.generate(batch.channel_id, batch.text, priority)
+        except Exception as e:
+            if turn is not None:
+                turn.done.set()
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if fut.done():
+            if turn is not None:
+                turn.done.set()
+        else:
+            fut.set_result((reply, turn))
@@ -0,0 +1,90 @@
+# coalesce.py
+# Per-channel debounce in front of generation. Messages arriving within
+# `window` seconds of each other form one burst (flushed at the latest
+# `max_wait` seconds after it started) and produce at most one generation.
+# New input cancels a burst that is still generating; its messages, mention
+# and turn flags, reply decision and start time carry over into the next
+# burst, so max_wait bounds the whole wait. A mention reply is never cancelled
+# and other bursts at most MAX_RESTARTS times, so busy channels still get replies.
+import time
+import asyncio
+
+COALESCE_WINDOW = 1.5   # seconds of quiet that end a burst
+COALESCE_MAX_WAIT = 5   # seconds a burst may keep growing
+MAX_RESTARTS = 2        # times a generating burst may be cancelled by newer input
+MAX_MESSAGES = 20       # newest messages kept in a burst
+
+
+class Burst:
+    __slots__ = ("channel", "messages", "mentioned", "chosen", "replying", "sending", "started", "restarts",
+                 "timer", "task")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.messages = []
+        self.mentioned = False   # any message in the burst mentioned this bot
+        self.chosen = None       # the turn arbiter gave this bot any message in the burst (None: no arbiter)
+        self.replying = False    # an autonomous reply was already decided (and rate-limited)
+        self.sending = False     # past generation; no longer cancellable
+        self.started = time.monotonic()
+        self.restarts = 0        # generations of earlier bursts cancelled in favour of this one
+        self.timer = None
+        self.task = None
+
+    def text(self):
+        return "\n".join(m.content for m in self.messages)
+
+
+class Coalescer:
+    def __init__(self, flush, window=COALESCE_WINDOW, max_wait=COALESCE_MAX_WAIT):
+        self.flush = flush       # async flush(burst)
+        self.window = window
+        self.max_wait = max_wait
+        self._bursts = {}        # channel_id -> Burst collecting input
+        self._inflight = {}      # channel_id -> Burst being generated/sent
+        self.stats = {"messages": 0, "flushes": 0, "cancelled": 0}
+
+    def pending(self):
+        return len(self._bursts) + len(self._inflight)
+
+    def submit(self, channel, message, mentioned=False, chosen=None):
+        self.stats["messages"] += 1
+        burst = self._bursts.get(channel.id)
+        if burst is None:
+            burst = self._bursts[channel.id] = Burst(channel)
+            stale = self._inflight.get(channel.id)
+            if (stale is not None and not stale.sending and not stale.mentioned
+                    and stale.restarts < MAX_RESTARTS):
+                stale.task.cancel()
+                self.stats["cancelled"] += 1
+                burst.messages.extend(stale.messages)
+                burst.chosen = stale.chosen
+                burst.replying = stale.replying
+                burst.started = stale.started
+                burst.restarts = stale.restarts + 1
+        burst.messages.append(message)
+        if len(burst.messages) > MAX_MESSAGES:
+            del burst.messages[:-MAX_MESSAGES]
+        burst.mentioned = burst.mentioned or mentioned
+        if chosen is not None:
+            burst.chosen = bool(burst.chosen) or chosen
+
+        if burst.timer is not None:
+            burst.timer.cancel()
+        delay = min(self.window, burst.started + self.max_wait - time.monotonic())
+        burst.timer = asyncio.get_running_loop().call_later(max(0, delay), self._fire, channel.id)
+
+    def _fire(self, channel_id):
+        burst = self._bursts.pop(channel_id)
+        self.stats["flushes"] += 1
+        self._inflight[channel_id] = burst
+        burst.task = asyncio.create_task(self._run(channel_id, burst))
+
+    async def _run(self, channel_id, burst):
+        try:
+            await self.flush(burst)
+        except asyncio.CancelledError:
+            pass  # superseded by newer input
+        finally:
+            if self._inflight.get(channel_id) is burst:
+                del self._inflight[channel_id]
@@ -0,0 +1,281 @@
+# fakes.py
+# Offline stand-ins for Discord and Gemini, used by loadtest.py.
+# FakeGateway owns N guilds x M text channels and delivers every message to
+# every FakeClient, like the real gateway does for bots sharing a guild. A
+# client created with shard ids only sees and receives its shards' guilds.
+# StubModel mimics genai.GenerativeModel (async, streamed and sync calls) with
+# configurable latency and failure rates; StubGenAI exposes the small part of
+# the google.generativeai module PrefixCache uses.
+import re
+import json
+import time
+import random
+import asyncio
+import itertools
+import types
+
+from batch import PERSONA_LIST
+from sharding import shard_for
+
+_ids = itertools.count(10_000)
+_guild_ids = itertools.count(1)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeUser:
+    def __init__(self, name, bot=False):
+        self.id = next_id()
+        self.name = name
+        self.bot = bot
+
+    def __str__(self):
+        return self.name
+
+
+class FakePermissions:
+    send_messages = True
+
+
+class FakeGuild:
+    def __init__(self, gateway, index):
+        self.id = next(_guild_ids) << 22  # snowflake-shaped, so shard_for spreads guilds over shards
+        self.name = f"guild-{index}"
+        self.gateway = gateway
+        self.text_channels = []
+        self.me = None
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content, mentions=()):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mentions = list(mentions)
+        self.created = time.perf_counter()
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+
+class FakeChannel:
+    def __init__(self, guild, index, send_latency=0.0):
+        self.id = next_id()
+        self.name = f"channel-{index}"
+        self.guild = guild
+        self.send_latency = send_latency
+        self.sent = []
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def send(self, content, author=None):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        message = FakeMessage(self, author, content)
+        self.sent.append(message)
+        self.guild.gateway.on_send(message)
+        # the gateway echoes the bot's own message back to every client
+        self.guild.gateway.dispatch(message)
+        return message
+
+
+class BoundChannel:
+    # what a FakeClient's get_channel returns: sends as that client's user
+    def __init__(self, channel, user):
+        self._channel = channel
+        self._user = user
+        self.id = channel.id
+        self.guild = channel.guild
+
+    def permissions_for(self, member):
+        return self._channel.permissions_for(member)
+
+    async def send(self, content):
+        return await self._channel.send(content, author=self._user)
+
+
+class FakeClient:
+    def __init__(self, gateway, user, shard_ids=None, shard_count=None):
+        self.gateway = gateway
+        self.user = user
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.loop = None
+        self.setup_hook = None
+        self._handlers = {}
+        self._closed = False
+
+    def event(self, coro):
+        self._handlers[coro.__name__] = coro
+        return coro
+
+    def owns(self, guild):
+        return self.shard_ids is None or shard_for(guild.id, self.shard_count) in self.shard_ids
+
+    @property
+    def guilds(self):
+        return [g for g in self.gateway.guilds if self.owns(g)]
+
+    def get_channel(self, channel_id):
+        channel = self.gateway.channels.get(channel_id)
+        if channel is None or not self.owns(channel.guild):
+            return None
+        return BoundChannel(channel, self.user)
+
+    async def wait_until_ready(self):
+        return None
+
+    def is_closed(self):
+        return self._closed
+
+    async def close(self):
+        self._closed = True
+
+
+class FakeGateway:
+    def __init__(self, guilds=1, channels=5, send_latency=0.0):
+        self.guilds = []
+        self.channels = {}
+        self.clients = []
+        self.users = {}      # persona name -> bot user, shared by that bot's shard clients
+        self.listeners = []  # callables(message) notified of every bot send
+        for g in range(guilds):
+            guild = FakeGuild(self, g)
+            for c in range(channels):
+                channel = FakeChannel(guild, c, send_latency)
+                guild.text_channels.append(channel)
+                self.channels[channel.id] = channel
+            self.guilds.append(guild)
+
+    def client(self, name, shard_ids=None, shard_count=None):
+        user = self.users.get(name)
+        if user is None:
+            user = self.users[name] = FakeUser(name, bot=True)
+        client = FakeClient(self, user, shard_ids, shard_count)
+        self.clients.append(client)
+        return client
+
+    def on_send(self, message):
+        for listener in self.listeners:
+            listener(message)
+
+    def dispatch(self, message):
+        # every client owning the guild receives the message as its own task, like discord.py
+        for client in self.clients:
+            if not client.owns(message.guild):
+                continue
+            handler = client._handlers.get("on_message")
+            if handler is not None:
+                asyncio.create_task(handler(message))
+
+
+class StubResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = types.SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            total_token_count=prompt_tokens + len(text),
+            cached_content_token_count=0,
+        )
+
+
+class StubStream:
+    def __init__(self, text, chunks, delay, prompt_tokens):
+        self._text = text
+        self._chunks = chunks
+        self._delay = delay
+        self._prompt_tokens = prompt_tokens
+
+    async def __aiter__(self):
+        size = max(1, len(self._text) // self._chunks)
+        for i in range(0, len(self._text), size):
+            await asyncio.sleep(self._delay)
+            yield StubResponse(self._text[i:i + size], self._prompt_tokens)
+
+
+class StubModel:
+    """genai.GenerativeModel look-alike with lognormal latency and injected failures."""
+
+    def __init__(self, model_name="stub", system_instruction=None, latency=0.8, sigma=0.5,
+                 failure_rate=0.0, quota_rate=0.0, reply_chars=200, chunks=8, seed=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.latency = latency          # median seconds
+        self.sigma = sigma              # lognormal spread
+        self.failure_rate = failure_rate
+        self.quota_rate = quota_rate    # share of calls failing with a 429
+        self.reply_chars = reply_chars
+        self.chunks = chunks
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _latency(self):
+        return self.latency * self.rng.lognormvariate(0, self.sigma)
+
+    def _outcome(self, prompt):
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        roll = self.rng.random()
+        if roll < self.quota_rate:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        if roll < self.quota_rate + self.failure_rate:
+            raise RuntimeError("503 The model is overloaded. Please try again later.")
+        text = "了解です。" * (self.reply_chars // 5)
+        batch = re.search(re.escape(PERSONA_LIST) + r"(.+)", prompt)
+        if batch:
+            # batch.py asks for one JSON reply per listed persona
+            roles = [r.strip() for r in batch.group(1).split(",")]
+            text = json.dumps({"replies": [{"persona": r, "text": text} for r in roles]}, ensure_ascii=False)
+        return text, len(prompt)
+
+    async def generate_content_async(self, prompt, stream=False):
+        delay = self._latency()
+        if stream:
+            await asyncio.sleep(delay / 3)
+            text, tokens = self._outcome(prompt)
+            return StubStream(text, self.chunks, delay * 2 / 3 / self.chunks, tokens)
+        await asyncio.sleep(delay)
+        text, tokens = self._outcome(prompt)
+        return StubResponse(text, tokens)
+
+    def generate_content(self, prompt):
+        time.sleep(self._latency())
+        text, tokens = self._outcome(prompt)
+        return StubResponse(text, tokens)
+
+
+class StubGenAI:
+    # the parts of google.generativeai that PrefixCache touches
+    def __init__(self, cache_supported=True, **model_options):
+        self.model_options = model_options
+        self.created = 0
+        self.models = []
+        stub = self
+
+        class CachedContent:
+            @staticmethod
+            def create(model, display_name=None, system_instruction=None, ttl=None):
+                if not cache_supported:
+                    raise RuntimeError("400 Cached content is too small")
+                stub.created += 1
+                return types.SimpleNamespace(model=model, system_instruction=system_instruction)
+
+        class GenerativeModel(StubModel):
+            def __init__(self, model_name, system_instruction=None):
+                super().__init__(model_name, system_instruction, **stub.model_options)
+                stub.models.append(self)
+
+            @staticmethod
+            def from_cached_content(cache):
+                return GenerativeModel(cache.model, cache.system_instruction)
+
+        self.caching = types.SimpleNamespace(CachedContent=CachedContent)
+        self.GenerativeModel = GenerativeModel
@@ -0,0 +1,138 @@
+# generation.py
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TIMEOUT = 60       # seconds allowed for one generation
+DEFAULT_CONCURRENCY = 2    # in-flight generations per bot
+EXECUTOR_WORKERS = 8       # threads for the sync fallback (shared by every bot in the process)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="gemini")
+    return _executor
+
+
+class GenerationTimeout(Exception):
+    pass
+
+
+class LazyGemini:
+    """Imports google.generativeai and builds the model on first use.
+
+    The SDK import and model setup dominate cold start, so the runtime connects
+    to the gateway first and warms this in a worker thread after on_ready.
+    """
+
+    def __init__(self, model_name, api_key):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.timings = {}  # phase -> seconds spent
+        self._sdk = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def sdk(self):
+        with self._lock:
+            if self._sdk is None:
+                start = time.perf_counter()
+                import google.generativeai as genai
+                self.timings["gemini_import"] = time.perf_counter() - start
+                genai.configure(api_key=self.api_key)
+                self._sdk = genai
+        return self._sdk
+
+    def model(self):
+        sdk = self.sdk()
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = sdk.GenerativeModel(self.model_name)
+                self.timings["gemini_model"] = time.perf_counter() - start
+        return self._model
+
+    async def load_sdk(self):
+        if self._sdk is None:
+            await asyncio.to_thread(self.sdk)
+        return self._sdk
+
+    async def resolve(self):
+        if self._model is None:
+            await asyncio.to_thread(self.model)
+        return self._model
+
+    warm = resolve
+
+
+class AsyncGenerator:
+    """Runs Gemini calls without blocking the discord.py event loop.
+
+    Uses the SDK's ``generate_content_async`` when the model has it and falls
+    back to a bounded thread pool otherwise. Each instance caps its own
+    concurrency, so one slow bot cannot starve the others.
+    """
+
+    def __init__(self, model, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.model = model
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    async def _call(self, model, prompt):
+        if isinstance(model, LazyGemini):
+            model = await model.resolve()
+        if hasattr(model, "generate_content_async"):
+            return await model.generate_content_async(prompt)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), model.generate_content, prompt)
+
+    async def generate(self, prompt, timeout=None, model=None):
+        # `model` overrides the default, e.g. a persona model with a cached prefix
+        timeout = timeout or self.timeout
+        async with self._sem:
+            task = asyncio.ensure_future(self._call(model or self.model, prompt))
+            self._tasks.add(task)
+            try:
+                return await asyncio.wait_for(task, timeout)
+            except asyncio.TimeoutError:
+                raise GenerationTimeout(f"Gemini generation timed out after {timeout}s")
+            finally:
+                self._tasks.discard(task)
+
+    async def stream(self, prompt, timeout=None, model=None):
+        # yields response chunks as they arrive; the whole stream shares one deadline.
+        # Models without the async SDK call yield their full response as one chunk.
+        model = model or self.model
+        timeout = timeout or self.timeout
+        async with self._sem:
+            if isinstance(model, LazyGemini):
+                model = await model.resolve()
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            try:
+                if not hasattr(model, "generate_content_async"):
+                    yield await asyncio.wait_for(self._call(model, prompt), timeout)
+                    return
+                resp = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), timeout)
+                chunks = resp.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            except asyncio.TimeoutError:
+                raise GenerationTimeout(f"Gemini generation timed out after {timeout}s")
+
+    def pending(self):
+        return len(self._tasks)
+
+    def cancel_all(self):
+        # e.g. on shutdown; awaiting callers get CancelledError
+        for task in list(self._tasks):
+            task.cancel()
@@ -0,0 +1,142 @@
+# history.py
+# Compact per-channel conversation history.
+# ChannelHistory is a fixed-capacity ring buffer: append is O(1) and window(n)
+# returns a view over the last n entries without copying them. HistoryBook
+# holds one ring per channel under a global channel/char budget and evicts the
+# least recently used channels when the budget is exceeded.
+import sys
+import time
+from collections import OrderedDict
+
+MAX_CHANNELS = 10000       # channels kept in memory
+MAX_CHARS = 16_000_000     # total content chars kept across all channels
+
+
+class Entry:
+    __slots__ = ("role", "content", "ts", "line", "tokens")
+
+    def __init__(self, role, content, ts):
+        self.role = sys.intern(role)  # a handful of speaker names shared by every entry
+        self.content = content
+        self.ts = ts
+        # rendered prompt line and its token estimate, filled in once by prompt.render
+        self.line = None
+        self.tokens = 0
+
+    def __repr__(self):
+        return f"Entry({self.role!r}, {self.content!r}, {self.ts!r})"
+
+
+class HistoryView:
+    # valid until the next append to the underlying ring
+    __slots__ = ("_buf", "_first", "_len")
+
+    def __init__(self, buf, first, length):
+        self._buf = buf
+        self._first = first
+        self._len = length
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        buf = self._buf
+        cap = len(buf)
+        first = self._first
+        for i in range(self._len):
+            yield buf[(first + i) % cap]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("history index out of range")
+        return self._buf[(self._first + i) % len(self._buf)]
+
+
+class ChannelHistory:
+    __slots__ = ("_buf", "_start", "_len", "chars")
+
+    def __init__(self, capacity):
+        self._buf = [None] * capacity
+        self._start = 0
+        self._len = 0
+        self.chars = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    def append(self, entry):
+        # returns the entry that fell off the front, if any
+        buf = self._buf
+        cap = len(buf)
+        dropped = None
+        if self._len < cap:
+            buf[(self._start + self._len) % cap] = entry
+            self._len += 1
+        else:
+            dropped = buf[self._start]
+            buf[self._start] = entry
+            self._start = (self._start + 1) % cap
+            self.chars -= len(dropped.content)
+        self.chars += len(entry.content)
+        return dropped
+
+    def window(self, n):
+        n = max(0, min(n, self._len))
+        first = (self._start + self._len - n) % len(self._buf)
+        return HistoryView(self._buf, first, n)
+
+
+class HistoryBook:
+    def __init__(self, capacity, max_channels=MAX_CHANNELS, max_chars=MAX_CHARS):
+        self.capacity = capacity
+        self.max_channels = max_channels
+        self.max_chars = max_chars
+        self.chars = 0
+        self._channels = OrderedDict()  # channel_id -> ChannelHistory, oldest access first
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._channels
+
+    def get(self, channel_id):
+        hist = self._channels.get(channel_id)
+        if hist is not None:
+            self._channels.move_to_end(channel_id)
+        return hist
+
+    def append(self, channel_id, role, content, ts=None):
+        hist = self.get(channel_id)
+        if hist is None:
+            hist = self._channels[channel_id] = ChannelHistory(self.capacity)
+        before = hist.chars
+        dropped = hist.append(Entry(role, content, ts or time.time()))
+        self.chars += hist.chars - before
+        self._evict()
+        return dropped
+
+    def window(self, channel_id, n):
+        hist = self.get(channel_id)
+        if hist is None:
+            return HistoryView([None], 0, 0)
+        return hist.window(n)
+
+    def discard(self, channel_id):
+        hist = self._channels.pop(channel_id, None)
+        if hist is not None:
+            self.chars -= hist.chars
+        return hist
+
+    def _evict(self):
+        # never evicts the channel that was just written
+        while len(self._channels) > 1 and (
+                len(self._channels) > self.max_channels or self.chars > self.max_chars):
+            _, hist = self._channels.popitem(last=False)
+            self.chars -= hist.chars
@@ -0,0 +1,194 @@
+# ipc.py
+# Local IPC for the few things sharded workers must agree on. The launcher
+# runs one QuotaServer around the real QuotaManager; each worker talks to it
+# through RemoteQuota, which has the QuotaManager interface the runtime uses.
+# Line-delimited JSON over a loopback TCP socket:
+#   {"id": 1, "op": "acquire", "priority": 0, "tokens": 900} -> {"id": 1, "charged": 1300, "backoff": 0.0}
+#   {"op": "settle", "charged": 1300, "used": 1100}          (no id: no reply)
+#   {"op": "throttled"}
+#   {"id": 2, "op": "stats"}                                 -> {"id": 2, "queue_depth": 3, ...}
+#   QUOTA_IPC=127.0.0.1:7311  -> workers use the shared limiter (set by launcher.py)
+import os
+import json
+import types
+import asyncio
+import itertools
+
+from quota import QuotaExceeded, QuotaManager
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _usage(used):
+    # what QuotaManager.settle reads off a Gemini response
+    return types.SimpleNamespace(usage_metadata=types.SimpleNamespace(total_token_count=used))
+
+
+class QuotaServer:
+    def __init__(self, quota=None):
+        self.quota = quota or QuotaManager()
+        self.server = None
+        self._handlers = {}  # connection task -> writer
+
+    async def start(self, host="127.0.0.1", port=0):
+        # returns the bound (host, port); port 0 picks a free one
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in self._handlers.values():
+                writer.close()
+            # let the connection handlers see EOF and finish before the loop goes away
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self._handlers[asyncio.current_task()] = writer
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                # acquire may wait in the queue; keep reading while it does
+                task = asyncio.create_task(self._handle(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as e:
+            print(f"Quota IPC client dropped: {type(e).__name__}: {e}")
+        finally:
+            self._handlers.pop(asyncio.current_task(), None)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _handle(self, req, writer):
+        quota = self.quota
+        op = req.get("op")
+        reply = {"id": req.get("id")}
+        try:
+            if op == "acquire":
+                reply["charged"] = await quota.acquire(req["priority"], req["tokens"])
+            elif op == "settle":
+                quota.settle(req["charged"], _usage(req.get("used", 0)))
+            elif op == "throttled":
+                quota.throttled()
+            elif op == "stats":
+                reply.update(queue_depth=quota.queue_depth(), stats=quota.stats)
+            else:
+                reply["error"] = f"unknown op: {op}"
+        except QuotaExceeded as e:
+            reply["error"] = str(e)
+        if reply["id"] is None:
+            return
+        reply["backoff"] = quota.backoff
+        writer.write(json.dumps(reply).encode() + b"\n")
+
+
+class RemoteQuota:
+    """QuotaManager stand-in for a sharded worker; the queue lives in the launcher."""
+
+    def __init__(self, address):
+        self.address = address
+        self.backoff = 0.0          # last value reported by the server
+        self._reader_task = None
+        self._writer = None
+        self._connecting = asyncio.Lock()
+        self._pending = {}          # request id -> future
+        self._ids = itertools.count(1)
+        self._posts = set()
+        self._waiting = 0
+        self.stats = {"granted": 0, "rejected": 0, "throttled": 0}
+
+    def queue_depth(self):
+        # this worker's requests queued at the server
+        return self._waiting
+
+    async def _connect(self):
+        async with self._connecting:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_connection(*self.address)
+                self._reader_task = asyncio.create_task(self._read(reader))
+            return self._writer
+
+    async def _read(self, reader):
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                fut = self._pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        finally:
+            self._writer = None
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("quota server closed the connection"))
+            self._pending.clear()
+
+    async def _call(self, op, **fields):
+        writer = await self._connect()
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        writer.write(json.dumps({"id": rid, "op": op, **fields}).encode() + b"\n")
+        try:
+            msg = await fut
+        finally:
+            self._pending.pop(rid, None)
+        self.backoff = msg.get("backoff", self.backoff)
+        return msg
+
+    async def _post_now(self, op, fields):
+        try:
+            writer = await self._connect()
+            writer.write(json.dumps({"op": op, **fields}).encode() + b"\n")
+        except OSError as e:
+            print(f"Quota IPC {op} lost: {type(e).__name__}: {e}")
+
+    def _post(self, op, **fields):
+        task = asyncio.create_task(self._post_now(op, fields))
+        self._posts.add(task)
+        task.add_done_callback(self._posts.discard)
+
+    async def acquire(self, priority, prompt_tokens):
+        self._waiting += 1
+        try:
+            msg = await self._call("acquire", priority=priority, tokens=prompt_tokens)
+        except OSError as e:
+            # never fall back to a local limiter: N workers would each spend the whole quota
+            self.stats["rejected"] += 1
+            raise QuotaExceeded(f"quota server unavailable: {e}")
+        finally:
+            self._waiting -= 1
+        if "error" in msg:
+            self.stats["rejected"] += 1
+            raise QuotaExceeded(msg["error"])
+        self.stats["granted"] += 1
+        return msg["charged"]
+
+    def settle(self, charged, resp):
+        usage = getattr(resp, "usage_metadata", None)
+        self._post("settle", charged=charged, used=getattr(usage, "total_token_count", 0) or 0)
+
+    def throttled(self):
+        self.stats["throttled"] += 1
+        self._post("throttled")
+
+    async def remote_stats(self):
+        return await self._call("stats")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+
+def open_quota():
+    # QUOTA_IPC set: share the launcher's limiter; otherwise this process has its own
+    address = os.getenv("QUOTA_IPC")
+    if address:
+        return RemoteQuota(parse_address(address))
+    return QuotaManager()
@@ -0,0 +1,97 @@
+# launcher.py
+# Spreads guild shards over worker processes on one machine. Each worker is a
+# runtime.py process hosting every requested persona for a contiguous range
+# of shard ids; this process owns the one Gemini quota they share (ipc.py) and
+# restarts workers that exit.
+#   python launcher.py --shards 8 --workers 4
+#   python launcher.py --shards 4 --workers 2 engineer thinker
+# METRICS_PORT=9108 gives worker i the port 9108 + i.
+import os
+import sys
+import signal
+import asyncio
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()  # before quota.py reads GEMINI_RPM / GEMINI_TPM for the shared limiter
+
+from ipc import QuotaServer
+from sharding import format_ids, split
+
+RESTART_DELAY = 5        # seconds before a crashed worker is started again
+RESTART_DELAY_MAX = 300
+HEALTHY_AFTER = 60       # a worker up this long resets its restart delay
+RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime.py")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Run persona bots as sharded worker processes")
+    ap.add_argument("roles", nargs="*", help="persona roles (default: all)")
+    ap.add_argument("--shards", type=int, required=True, help="total shard count for every bot")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    return ap.parse_args(argv)
+
+
+def worker_env(index, shard_ids, shard_count, quota_address):
+    env = dict(os.environ)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = format_ids(shard_ids)
+    env["QUOTA_IPC"] = "%s:%d" % quota_address
+    port = os.getenv("METRICS_PORT")
+    if port:
+        env["METRICS_PORT"] = str(int(port) + index)
+    return env
+
+
+async def supervise(index, roles, env):
+    loop = asyncio.get_running_loop()
+    delay = RESTART_DELAY
+    while True:
+        started = loop.time()
+        proc = await asyncio.create_subprocess_exec(sys.executable, RUNTIME, *roles, env=env)
+        print(f"worker {index} (shards {env['SHARD_IDS']}) started, pid {proc.pid}")
+        try:
+            code = await proc.wait()
+        except asyncio.CancelledError:
+            proc.terminate()
+            await proc.wait()
+            raise
+        if loop.time() - started > HEALTHY_AFTER:
+            delay = RESTART_DELAY
+        print(f"worker {index} exited with {code}; restarting in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(RESTART_DELAY_MAX, delay * 2)
+
+
+async def launch(roles, shard_count, workers):
+    try:
+        # SIGTERM (service stop) shuts the workers down like Ctrl-C does
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass  # Windows
+    server = QuotaServer()
+    address = await server.start()
+    print(f"quota server on {address[0]}:{address[1]}")
+    ranges = split(shard_count, workers)
+    tasks = [asyncio.create_task(supervise(i, roles, worker_env(i, ids, shard_count, address)))
+             for i, ids in enumerate(ranges)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await server.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(launch(args.roles, args.shards, args.workers))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# loadtest.py
+# Offline load test for the runtime: a simulated gateway (fakes.FakeGateway)
+# with N guilds x M channels feeds user messages at a configurable rate and a
+# stub Gemini model answers with configurable latency and failures. Needs no
+# Discord or Gemini credentials, so it runs in CI.
+#   python loadtest.py --guilds 5 --channels 20 --rate 20 --duration 30
+#   python loadtest.py --set COALESCE_WINDOW=1.5 --set STREAM_REPLIES=mentions --latency 1.5
+#   python loadtest.py --shards 4 --workers 2   (one runtime per worker, quota shared over ipc.py)
+# Reports throughput, p50/p99 reply latency, event-loop blocking and memory per channel.
+# With --max-mention-p99 it exits non-zero when a mention goes unanswered or the
+# mention p99 exceeds the bound (tests/ runs the same check).
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+LAG_INTERVAL = 0.01   # seconds between event-loop blocking samples
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Offline load test with a fake gateway and stub Gemini model")
+    ap.add_argument("--personas", nargs="*", default=None, help="persona roles (default: all)")
+    ap.add_argument("--guilds", type=int, default=2)
+    ap.add_argument("--channels", type=int, default=10, help="text channels per guild")
+    ap.add_argument("--active", type=float, default=1.0, help="share of channels that receive traffic")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--rate", type=float, default=5.0, help="user messages per second, all channels")
+    ap.add_argument("--mention-rate", type=float, default=0.2, help="share of messages mentioning a persona")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of traffic")
+    ap.add_argument("--drain", type=float, default=5.0, help="seconds to wait for in-flight replies")
+    ap.add_argument("--latency", type=float, default=0.8, help="median stub model latency (s)")
+    ap.add_argument("--sigma", type=float, default=0.5, help="lognormal spread of model latency")
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--quota-rate", type=float, default=0.0, help="share of calls failing with 429")
+    ap.add_argument("--reply-chars", type=int, default=200)
+    ap.add_argument("--send-latency", type=float, default=0.05, help="simulated channel.send latency (s)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--shards", type=int, default=0, help="guild shard count (0: unsharded)")
+    ap.add_argument("--workers", type=int, default=1, help="runtimes sharing the shards, in this process")
+    ap.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no memory numbers)")
+    ap.add_argument("--max-mention-p99", type=float, default=None, metavar="SECONDS",
+                    help="fail unless every mention is answered with p99 under this bound")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                    help="environment override applied before the runtime is imported")
+    return ap.parse_args(argv)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Recorder:
+    def __init__(self, clients):
+        self.personas = {c.user.id for c in clients}
+        self.pending_mentions = {}  # (channel_id, bot user id) -> [created, ...]
+        self.last_user = {}         # channel_id -> created of latest user message
+        self.mention_latency = []
+        self.reply_latency = []
+        self.user_messages = 0
+        self.replies = 0
+
+    def user_message(self, message):
+        self.user_messages += 1
+        self.last_user[message.channel.id] = message.created
+        for user in message.mentions:
+            self.pending_mentions.setdefault((message.channel.id, user.id), []).append(message.created)
+
+    def bot_send(self, message):
+        if message.author is None or message.author.id not in self.personas:
+            return
+        if not message.content.startswith("**["):
+            return  # follow-up part of a long reply
+        now = time.perf_counter()
+        self.replies += 1
+        pending = self.pending_mentions.pop((message.channel.id, message.author.id), None)
+        if pending:
+            self.mention_latency.append(now - pending[0])
+        last = self.last_user.get(message.channel.id)
+        if last is not None:
+            self.reply_latency.append(now - last)
+
+
+async def sample_loop_blocking(samples):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def drive_traffic(args, gateway, users, recorder, rng):
+    from fakes import FakeMessage
+
+    channels = list(gateway.channels.values())
+    active = channels[:max(1, int(len(channels) * args.active))]
+    bots = list(gateway.users.values())
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(rng.expovariate(args.rate))
+        channel = rng.choice(active)
+        mentions = [rng.choice(bots)] if bots and rng.random() < args.mention_rate else []
+        text = rng.choice(("新しいAPIの設計について意見をください", "このUIの配色どう思いますか",
+                           "来期の集客施策を考えたいです", "そもそも良い設計とは何でしょう"))
+        message = FakeMessage(channel, rng.choice(users), text, mentions)
+        recorder.user_message(message)
+        gateway.dispatch(message)
+
+
+async def run_load(args):
+    for item in args.set:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    # the stub has no real quota; keep the local limiter out of the way unless asked
+    os.environ.setdefault("GEMINI_RPM", "1000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+    import runtime
+    from fakes import FakeGateway, FakeUser, StubModel, StubGenAI
+    from generation import AsyncGenerator
+    from ipc import QuotaServer, RemoteQuota
+    from metrics import METRICS
+    from pernona import PERSONAS
+    from prefix_cache import PrefixCache
+    from sharding import ShardPlan, split
+
+    rng = random.Random(args.seed)
+    if not args.no_memory:
+        tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0] if not args.no_memory else 0
+
+    model_options = dict(latency=args.latency, sigma=args.sigma, failure_rate=args.failure_rate,
+                         quota_rate=args.quota_rate, reply_chars=args.reply_chars, seed=args.seed)
+    model = StubModel(**model_options)
+    gateway = FakeGateway(args.guilds, args.channels, args.send_latency)
+    roles = args.personas or list(PERSONAS)
+    genai_stub = StubGenAI(**model_options)
+    quota_server = None
+    if args.shards:
+        plans = [ShardPlan(args.shards, ids) for ids in split(args.shards, args.workers)]
+    else:
+        plans = [None]
+    if len(plans) > 1:
+        # workers share one limiter through the same IPC the launcher uses
+        quota_server = QuotaServer()
+        address = await quota_server.start()
+    runtimes = []
+    for plan in plans:
+        quota = RemoteQuota(address) if quota_server is not None else None
+        rt = runtime.Runtime([PERSONAS[r] for r in roles], shards=plan, quota=quota)
+        if runtime.PREFIX_CACHE != "off":
+            rt.prefix_cache = PrefixCache("stub", runtime.PREFIX_CACHE, api=genai_stub)
+        for persona in rt.personas:
+            client = (gateway.client(persona.name) if plan is None
+                      else gateway.client(persona.name, plan.ids, plan.count))
+            bot = runtime.PersonaBot(rt, persona, None, AsyncGenerator(model), None, client=client)
+            rt.bots.append(bot)
+        rt.register_metrics()
+        runtimes.append(rt)
+    bots = [bot for rt in runtimes for bot in rt.bots]
+
+    recorder = Recorder(gateway.clients)
+    gateway.listeners.append(recorder.bot_send)
+    users = [FakeUser(f"user{i}") for i in range(args.users)]
+    lag = []
+    background = [asyncio.create_task(sample_loop_blocking(lag))]
+    background += [asyncio.create_task(bot.periodic_initiator()) for bot in bots]
+
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    await drive_traffic(args, gateway, users, recorder, rng)
+    await asyncio.sleep(args.drain)
+    elapsed, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    for task in background:
+        task.cancel()
+    for bot in bots:
+        bot.generator.cancel_all()
+    for rt in runtimes:
+        if rt.outbox is not None:
+            rt.outbox.close()
+    if quota_server is not None:
+        for rt in runtimes:
+            rt.quota.close()
+        await quota_server.close()
+
+    stores = [s for rt in runtimes for s in getattr(rt.store, "stores", {0: rt.store}).values()]
+    histories = [s.history for s in stores if hasattr(s, "history")]
+    channels_held = sum(map(len, histories)) if histories else len(gateway.channels)
+    mem_after = tracemalloc.get_traced_memory()[0] if not args.no_memory else 0
+    if not args.no_memory:
+        tracemalloc.stop()
+
+    models = [model, *genai_stub.models]
+    calls = sum(m.calls for m in models)
+    prompt_chars = sum(m.prompt_chars for m in models)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json",)},
+        "elapsed_s": round(elapsed, 2),
+        "cpu_s": round(cpu, 2),
+        "user_messages": recorder.user_messages,
+        "replies": recorder.replies,
+        "llm_calls": calls,
+        "llm_calls_per_message": round(calls / max(1, recorder.user_messages), 3),
+        "llm_prompt_chars_per_call": round(prompt_chars / max(1, calls)),
+        "throughput_msgs_per_s": round(recorder.user_messages / args.duration, 2),
+        "replies_per_s": round(recorder.replies / elapsed, 2),
+        "unanswered_mentions": sum(map(len, recorder.pending_mentions.values())),
+        "mention_latency_s": {"n": len(recorder.mention_latency),
+                              "p50": round(percentile(recorder.mention_latency, 0.5), 3),
+                              "p99": round(percentile(recorder.mention_latency, 0.99), 3)},
+        "reply_latency_s": {"p50": round(percentile(recorder.reply_latency, 0.5), 3),
+                            "p99": round(percentile(recorder.reply_latency, 0.99), 3)},
+        "loop_blocking_s": {"p99": round(percentile(lag, 0.99), 4),
+                            "max": round(max(lag, default=0.0), 4),
+                            "total": round(sum(lag), 3)},
+        "memory_per_channel_bytes": (round((mem_after - mem_before) / max(1, channels_held))
+                                     if not args.no_memory else None),
+        "counters": METRICS.snapshot()["counters"],
+    }
+
+
+def print_report(report):
+    print(f"elapsed {report['elapsed_s']}s (cpu {report['cpu_s']}s)")
+    print(f"user messages {report['user_messages']} ({report['throughput_msgs_per_s']}/s), "
+          f"replies {report['replies']} ({report['replies_per_s']}/s)")
+    print(f"llm calls {report['llm_calls']} ({report['llm_calls_per_message']} per message, "
+          f"{report['llm_prompt_chars_per_call']} prompt chars each)")
+    m, r, lag = report["mention_latency_s"], report["reply_latency_s"], report["loop_blocking_s"]
+    print(f"mention latency p50 {m['p50']}s p99 {m['p99']}s (n={m['n']}, "
+          f"{report['unanswered_mentions']} unanswered)")
+    print(f"reply latency   p50 {r['p50']}s p99 {r['p99']}s")
+    print(f"loop blocking   p99 {lag['p99']}s max {lag['max']}s total {lag['total']}s")
+    if report["memory_per_channel_bytes"] is not None:
+        print(f"memory per channel {report['memory_per_channel_bytes']} bytes")
+    for name, values in sorted(report["counters"].items()):
+        print(f"  {name}: " + ", ".join(f"{k or '-'}={v}" for k, v in sorted(values.items())))
+
+
+def check(report, max_mention_p99):
+    # -> list of failed checks, empty when the run passes
+    failures = []
+    if report["unanswered_mentions"]:
+        failures.append(f"{report['unanswered_mentions']} mentions unanswered")
+    p99 = report["mention_latency_s"]["p99"]
+    if p99 > max_mention_p99:
+        failures.append(f"mention p99 {p99}s over {max_mention_p99}s")
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run_load(args))
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report)
+    if args.max_mention_p99 is not None:
+        failures = check(report, args.max_mention_p99)
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# metrics.py
+# In-process counters, gauges and fixed-bucket histograms, cheap enough to
+# leave on in production (a dict lookup and a bisect per sample). Exported as
+# Prometheus text on a local HTTP endpoint and/or as a periodic JSON dump.
+#   METRICS_PORT=9108            -> http://127.0.0.1:9108/metrics
+#   METRICS_JSON=/tmp/bots.json  -> rewritten every METRICS_JSON_INTERVAL seconds
+import os
+import json
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+LOOP_LAG_INTERVAL = 0.5   # seconds between event-loop lag samples
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th sample
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.gauges = {}      # name -> callable returning a number or {label tuple: number}
+        self.help = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = _key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, fn, help=""):
+        self.gauges[name] = fn
+        if help:
+            self.help[name] = help
+
+    def _gauge_values(self, fn):
+        try:
+            value = fn()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [(tuple(sorted(labels)), v) for labels, v in value.items()]
+        return [((), value)]
+
+    def render_prometheus(self):
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        for name, fn in sorted(self.gauges.items()):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            for labels, value in self._gauge_values(fn):
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        for (name, labels), hist in sorted(self.histograms.items()):
+            seen = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                seen += n
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {seen}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {hist.count}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.sum}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        def label_str(labels):
+            return ",".join(f"{k}={v}" for k, v in labels)
+
+        out = {"ts": time.time(), "counters": {}, "gauges": {}, "histograms": {}}
+        for (name, labels), value in self.counters.items():
+            out["counters"].setdefault(name, {})[label_str(labels)] = value
+        for name, fn in self.gauges.items():
+            for labels, value in self._gauge_values(fn):
+                out["gauges"].setdefault(name, {})[label_str(labels)] = value
+        for (name, labels), hist in self.histograms.items():
+            out["histograms"].setdefault(name, {})[label_str(labels)] = {
+                "count": hist.count, "sum": hist.sum,
+                "p50": hist.quantile(0.5), "p99": hist.quantile(0.99),
+            }
+        return out
+
+
+METRICS = Registry()
+
+
+async def monitor_loop_lag(registry=METRICS, interval=LOOP_LAG_INTERVAL):
+    # how late the loop wakes us up is how long something else blocked it
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        registry.observe("event_loop_lag_seconds", max(0.0, loop.time() - start - interval))
+
+
+async def serve_prometheus(port, registry=METRICS, host="127.0.0.1"):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def dump_json(path, interval, registry=METRICS):
+    while True:
+        await asyncio.sleep(interval)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(registry.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def start_exporters(registry=METRICS):
+    # starts whatever METRICS_PORT / METRICS_JSON ask for; returns the background tasks
+    tasks = [asyncio.create_task(monitor_loop_lag(registry))]
+    port = os.getenv("METRICS_PORT")
+    if port:
+        tasks.append(asyncio.create_task(serve_prometheus(int(port), registry)))
+    path = os.getenv("METRICS_JSON")
+    if path:
+        interval = float(os.getenv("METRICS_JSON_INTERVAL", "60"))
+        tasks.append(asyncio.create_task(dump_json(path, interval, registry)))
+    return tasks
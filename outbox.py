@@ -0,0 +1,179 @@
+# outbox.py
+# Outbound dispatcher for channel.send. Every post goes through one queue per
+# channel, ordered by priority (mention replies first) and then arrival, and
+# is paced against local copies of Discord's buckets: per bot and channel
+# (5 messages / 5 s) and per bot overall (50 requests / s). A post whose
+# bucket is empty does not hold up another persona's post in the same channel.
+# Adjacent short posts from the same persona leave as one message.
+# Edits (streaming.py) use a separate route and are paced by the streamer.
+import time
+import asyncio
+from bisect import insort
+
+from metrics import METRICS
+from quota import TokenBucket
+from streaming import DISCORD_LIMIT
+
+CHANNEL_BURST = 5          # messages per bot and channel ...
+CHANNEL_PER_SECOND = 1.0   # ... refilled at this rate (Discord: 5 per 5 s)
+GLOBAL_PER_SECOND = 50     # requests per bot, all routes
+MERGE_MAX_CHARS = 400      # posts up to this long may be merged with their neighbour
+
+
+class Delivery:
+    __slots__ = ("message", "merged")
+
+    def __init__(self, message, merged=False):
+        self.message = message   # the Discord message that carries the post
+        self.merged = merged     # appended to an earlier post's message
+
+
+class Post:
+    __slots__ = ("priority", "seq", "bot", "channel", "content", "merge", "future", "queued")
+
+    def __init__(self, priority, seq, bot, channel, content, merge, future):
+        self.priority = priority
+        self.seq = seq
+        self.bot = bot
+        self.channel = channel
+        self.content = content
+        self.merge = merge
+        self.future = future
+        self.queued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox:
+    def __init__(self):
+        self._queues = {}       # channel_id -> [Post] sorted by (priority, seq)
+        self._wakeups = {}      # channel_id -> Event set when a post arrives
+        self._drains = {}       # channel_id -> drain task
+        self._buckets = {}      # (persona role, channel_id) -> TokenBucket
+        self._global = {}       # persona role -> TokenBucket
+        self._seq = 0
+        self.stats = {"posts": 0, "sent": 0, "merged": 0, "errors": 0}
+
+    def depth(self):
+        return sum(map(len, self._queues.values()))
+
+    def channels(self):
+        return len(self._queues)
+
+    async def post(self, bot, channel, content, priority, merge=False):
+        # returns a Delivery once the post is on Discord; raises what channel.send raised
+        self._seq += 1
+        self.stats["posts"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        channel_id = channel.id
+        insort(self._queues.setdefault(channel_id, []), Post(priority, self._seq, bot, channel, content, merge, fut))
+        wakeup = self._wakeups.get(channel_id)
+        if wakeup is not None:
+            wakeup.set()
+        if channel_id not in self._drains:
+            self._drains[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return await fut
+
+    async def send(self, bot, channel, content, priority):
+        return (await self.post(bot, channel, content, priority)).message
+
+    def close(self):
+        for task in list(self._drains.values()):
+            task.cancel()
+
+    def _buckets_for(self, bot, channel_id):
+        role = bot.persona.role
+        route = self._buckets.get((role, channel_id))
+        if route is None:
+            route = self._buckets[(role, channel_id)] = TokenBucket(CHANNEL_PER_SECOND * 60, CHANNEL_BURST)
+        overall = self._global.get(role)
+        if overall is None:
+            overall = self._global[role] = TokenBucket(GLOBAL_PER_SECOND * 60, GLOBAL_PER_SECOND)
+        return route, overall
+
+    def _next(self, queue, channel_id, now):
+        # first post (in priority order) whose buckets have room; else the shortest wait
+        wait = None
+        blocked = set()  # a bot's later posts stay behind its blocked one
+        for i, post in enumerate(queue):
+            if post.future.done():  # caller gave up (e.g. cancelled burst)
+                del queue[i]
+                return None, 0.0
+            if post.bot in blocked:
+                continue
+            route, overall = self._buckets_for(post.bot, channel_id)
+            w = max(route.wait_time(1, now), overall.wait_time(1, now))
+            if w <= 0:
+                return i, 0.0
+            blocked.add(post.bot)
+            wait = w if wait is None else min(wait, w)
+        return None, wait
+
+    async def _drain(self, channel_id):
+        queue = self._queues[channel_id]
+        wakeup = self._wakeups[channel_id] = asyncio.Event()
+        try:
+            while queue:
+                now = time.monotonic()
+                i, wait = self._next(queue, channel_id, now)
+                if i is None:
+                    if wait:
+                        METRICS.inc("outbox_throttled_total")
+                        wakeup.clear()
+                        try:
+                            await asyncio.wait_for(wakeup.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                    continue
+                posts = self._take(queue, i)
+                route, overall = self._buckets_for(posts[0].bot, channel_id)
+                route.take(1, now)
+                overall.take(1, now)
+                await self._send(posts)
+        finally:
+            del self._queues[channel_id]
+            del self._wakeups[channel_id]
+            del self._drains[channel_id]
+
+    def _take(self, queue, i):
+        # the post at i plus any directly following short posts by the same bot
+        posts = [queue.pop(i)]
+        first = posts[0]
+        size = len(first.content)
+        header = first.bot.header
+        while (first.merge and len(first.content) <= MERGE_MAX_CHARS and i < len(queue)):
+            nxt = queue[i]
+            if nxt.bot is not first.bot or not nxt.merge or len(nxt.content) > MERGE_MAX_CHARS:
+                break
+            extra = len(nxt.content) - (len(header) if nxt.content.startswith(header) else 0) + 1
+            if size + extra > DISCORD_LIMIT:
+                break
+            posts.append(queue.pop(i))
+            size += extra
+        return posts
+
+    async def _send(self, posts):
+        first = posts[0]
+        header = first.bot.header
+        content = "\n".join([first.content] + [p.content[len(header):] if p.content.startswith(header)
+                                               else p.content for p in posts[1:]])
+        now = time.monotonic()
+        for p in posts:
+            METRICS.observe("outbox_wait_seconds", now - p.queued)
+        try:
+            with METRICS.timer("discord_send_seconds", persona=first.bot.persona.role):
+                message = await first.channel.send(content)
+        except Exception as e:
+            self.stats["errors"] += 1
+            for p in posts:
+                if not p.future.done():
+                    p.future.set_exception(e)
+            return
+        self.stats["sent"] += 1
+        self.stats["merged"] += len(posts) - 1
+        if len(posts) > 1:
+            METRICS.inc("outbox_merged_total", len(posts) - 1)
+        for n, p in enumerate(posts):
+            if not p.future.done():
+                p.future.set_result(Delivery(message, merged=n > 0))
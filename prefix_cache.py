@@ -0,0 +1,92 @@
+# prefix_cache.py
+# Registers each persona's static prompt with Gemini once so requests only
+# carry the history delta.
+#   mode "cached": explicit context cache (CachedContent), refreshed before its TTL runs out
+#   mode "system": persona prompt as the model's system_instruction
+# "cached" falls back to "system" when the cache cannot be created (e.g. the
+# prompt is below the API's minimum cacheable size) and is retried after the TTL.
+# `api` is google.generativeai, a generation.LazyGemini (imported on first
+# use), or a stub with the same caching.CachedContent.create /
+# GenerativeModel surface to run offline.
+import time
+import asyncio
+import datetime
+
+MODES = ("off", "system", "cached")
+DEFAULT_TTL = 3600      # seconds a cached prefix lives on the server
+REFRESH_MARGIN = 60     # re-create the cache this long before it expires
+
+
+class PrefixCache:
+    def __init__(self, model_name, mode="cached", ttl=DEFAULT_TTL, api=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown prefix cache mode: {mode}")
+        if api is None:
+            import google.generativeai as api
+        self.api = api
+        self.model_name = model_name
+        self.mode = mode
+        self.ttl = ttl
+        self._models = {}  # persona role -> (model, kind, refresh_at)
+        self._locks = {}
+        self.stats = {
+            "requests": 0,             # generations sent with a registered prefix
+            "cached_requests": 0,      # ... of which used an explicit context cache
+            "cache_creates": 0,
+            "fallbacks": 0,            # cache creation failed, used system_instruction
+            "prefix_tokens_saved": 0,  # estimated prefix tokens not resent
+            "cached_tokens_reported": 0,  # usage_metadata.cached_content_token_count
+        }
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    async def model_for(self, persona):
+        # returns (model, kind) for the persona, registering the prefix if needed
+        entry = self._models.get(persona.role)
+        if entry and entry[2] > time.time():
+            return entry[0], entry[1]
+        lock = self._locks.setdefault(persona.role, asyncio.Lock())
+        async with lock:
+            entry = self._models.get(persona.role)
+            if entry and entry[2] > time.time():
+                return entry[0], entry[1]
+            model, kind = await self._register(persona)
+            self._models[persona.role] = (model, kind, time.time() + self.ttl - REFRESH_MARGIN)
+            return model, kind
+
+    async def _sdk(self):
+        if hasattr(self.api, "load_sdk"):
+            return await self.api.load_sdk()
+        return self.api
+
+    async def _register(self, persona):
+        api = await self._sdk()
+        if self.mode == "cached":
+            try:
+                cache = await asyncio.to_thread(
+                    api.caching.CachedContent.create,
+                    model=self.model_name,
+                    display_name=f"persona-{persona.role}",
+                    system_instruction=persona.prompt,
+                    ttl=datetime.timedelta(seconds=self.ttl),
+                )
+                self.stats["cache_creates"] += 1
+                return api.GenerativeModel.from_cached_content(cache), "cached"
+            except Exception as e:
+                print(f"Prefix cache unavailable for {persona.role}: {type(e).__name__}: {e}")
+                self.stats["fallbacks"] += 1
+        return api.GenerativeModel(self.model_name, system_instruction=persona.prompt), "system"
+
+    def invalidate(self, persona):
+        self._models.pop(persona.role, None)
+
+    def record(self, kind, prefix_tokens, resp):
+        self.stats["requests"] += 1
+        if kind != "cached":
+            return
+        self.stats["cached_requests"] += 1
+        self.stats["prefix_tokens_saved"] += prefix_tokens
+        usage = getattr(resp, "usage_metadata", None)
+        self.stats["cached_tokens_reported"] += getattr(usage, "cached_content_token_count", 0) or 0
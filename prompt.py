@@ -0,0 +1,64 @@
+# prompt.py
+# Incremental prompt assembly. Each history entry is rendered once and the
+# line is kept on the entry, so every persona and every later call reuses it;
+# the persona prefix is built once per persona. The history window is trimmed
+# by an estimated token budget instead of a fixed entry count. With a channel
+# summary (summarize.py) only the entries after it are sent raw.
+
+HISTORY_HEADER = "\n\n会話履歴（古い順）:\n"
+SUMMARY_HEADER = "\n\nこれまでの会話の要約:\n"
+
+
+def estimate_tokens(text):
+    # ~4 ASCII chars per token, ~1 token per CJK char; cheap enough for every message
+    n = len(text)
+    wide = (len(text.encode("utf-8")) - n) // 2
+    return wide + (n - wide) // 4 + 1
+
+
+def render(entry):
+    if entry.line is None:
+        entry.line = f"{entry.role}: {entry.content}\n"
+        entry.tokens = estimate_tokens(entry.line)
+    return entry.line
+
+
+class PromptBuilder:
+    def __init__(self, persona):
+        self.prefix = persona.prompt
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.history_tokens = persona.history_tokens
+        self.instruction = persona.instruction.format(name=persona.name)
+
+    def history(self, hist, after=None):
+        # newest entries first until the budget is spent (or an entry at or before
+        # `after`, already in the summary, is reached), returned oldest first
+        lines = []
+        used = 0
+        for i in range(len(hist) - 1, -1, -1):
+            entry = hist[i]
+            if after is not None and entry.ts <= after:
+                break
+            line = render(entry)
+            if used + entry.tokens > self.history_tokens and lines:
+                break
+            lines.append(line)
+            used += entry.tokens
+        lines.reverse()
+        return lines, used
+
+    def body(self, hist, user_text, summary=None):
+        # everything after the persona prefix; returns (parts, token estimate)
+        if summary is None:
+            lines, used = self.history(hist)
+            parts = [HISTORY_HEADER, *lines]
+        else:
+            lines, used = self.history(hist, summary.through)
+            parts = [SUMMARY_HEADER, summary.text, HISTORY_HEADER, *lines]
+            used += summary.tokens
+        parts += ["\n新しいユーザー発言: ", user_text, "\n\n", self.instruction]
+        return parts, used + estimate_tokens(user_text) + estimate_tokens(self.instruction)
+
+    def build(self, hist, user_text, summary=None):
+        parts, tokens = self.body(hist, user_text, summary)
+        return "".join([self.prefix, *parts]), self.prefix_tokens + tokens
@@ -0,0 +1,147 @@
+# quota.py
+# One limiter for everything that shares GEMINI_API_KEY: token buckets for
+# requests/min and tokens/min, a priority queue so mentions go ahead of
+# autonomous replies and periodic_initiator seeds, and a backoff that adapts
+# to quota errors reported by the API. Background summaries (SUMMARY) only
+# get what the others leave over.
+import os
+import time
+import heapq
+import asyncio
+import itertools
+
+MENTION = 0
+AUTOREPLY = 1
+INITIATOR = 2
+SUMMARY = 3
+
+# seconds a request may wait for quota before giving up, per priority
+MAX_WAIT = {MENTION: 30, AUTOREPLY: 10, INITIATOR: 5, SUMMARY: 60}
+
+REQUESTS_PER_MIN = int(os.getenv("GEMINI_RPM", "10"))
+TOKENS_PER_MIN = int(os.getenv("GEMINI_TPM", "250000"))
+OUTPUT_TOKENS = 400      # expected reply size added to the prompt estimate
+BACKOFF_BASE = 5         # seconds, first backoff after a quota error
+BACKOFF_MAX = 120
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n, now):
+        # seconds until n units are available
+        self._refill(now)
+        n = min(n, self.capacity)
+        if self.level >= n:
+            return 0.0
+        return (n - self.level) / self.rate
+
+    def take(self, n, now):
+        self._refill(now)
+        self.level -= n  # may go negative when correcting estimates; refills back over time
+
+
+class QuotaManager:
+    def __init__(self, requests_per_min=REQUESTS_PER_MIN, tokens_per_min=TOKENS_PER_MIN):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.backoff = 0.0
+        self.backoff_until = 0.0
+        self._waiters = []  # (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump_task = None
+        self.stats = {"granted": 0, "rejected": 0, "throttled": 0, "waited": 0.0}
+
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def _wait_time(self, tokens, now):
+        return max(self.backoff_until - now,
+                   self.requests.wait_time(1, now),
+                   self.tokens.wait_time(tokens, now))
+
+    def _grant(self, tokens, now):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.stats["granted"] += 1
+
+    async def acquire(self, priority, prompt_tokens):
+        # returns the token estimate charged; pass it back to settle()
+        tokens = prompt_tokens + OUTPUT_TOKENS
+        now = time.monotonic()
+        if not self._waiters and self._wait_time(tokens, now) <= 0:
+            self._grant(tokens, now)
+            return tokens
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, fut))
+        self._wakeup.set()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), MAX_WAIT.get(priority, 10))
+        except asyncio.TimeoutError:
+            if not fut.done():
+                fut.cancel()
+                self.stats["rejected"] += 1
+                raise QuotaExceeded("quota wait exceeded: local rate limit")
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        self.stats["waited"] += time.monotonic() - now
+        return tokens
+
+    async def _pump(self):
+        # grants queued requests in priority order as the buckets refill
+        while self._waiters:
+            _, _, tokens, fut = self._waiters[0]
+            if fut.done():  # timed out or cancelled
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            delay = self._wait_time(tokens, now)
+            if delay <= 0:
+                heapq.heappop(self._waiters)
+                self._grant(tokens, now)
+                fut.set_result(None)
+                continue
+            # a higher-priority arrival re-evaluates the head early
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def settle(self, charged, resp):
+        # correct the token bucket with the usage the API actually reported
+        usage = getattr(resp, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", 0) or 0
+        if actual:
+            self.tokens.take(actual - charged, time.monotonic())
+        self.backoff = self.backoff / 2 if self.backoff > 1 else 0.0
+
+    def throttled(self):
+        # the API rejected a call for quota; back off everyone
+        self.backoff = min(BACKOFF_MAX, max(BACKOFF_BASE, self.backoff * 2))
+        self.backoff_until = time.monotonic() + self.backoff
+        self.stats["throttled"] += 1
+
+
+def is_quota_error(e):
+    if isinstance(e, QuotaExceeded):
+        return False  # ours, not the API's
+    text = f"{type(e).__name__} {e}".upper()
+    return any(k in text for k in ("QUOTA", "RESOURCEEXHAUSTED", "RESOURCE_EXHAUSTED", "429", "RATE LIMIT"))
@@ -0,0 +1,197 @@
+# replay.py
+# Offline replay of recorded channel traffic through the autoreply decision,
+# to compare the fixed base_prob policy with the activity model (activity.py)
+# before turning ACTIVITY on. Input is either a trace recorded with
+# ACTIVITY_TRACE=path.jsonl or the messages table of a CONVERSATION_DB (which
+# has no author ids: every human counts as one participant). Recorded persona
+# replies are dropped; each persona decides again on every human message with
+# its cooldown and max_in_window, and the turn arbiter when --turns > 0.
+# Mentions are not in the recordings; they are answered under either policy.
+#   python replay.py --trace traffic.jsonl --budget 5
+#   python replay.py --db log.db --turns 0 --json
+import sys
+import json
+import random
+import sqlite3
+import argparse
+from collections import deque
+
+from activity import ActivityModel
+from arbiter import TurnArbiter, MAX_TURN_REPLIES
+from pernona import PERSONAS
+
+USER_ROLE = "ユーザー"   # as logged by runtime.py
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Replay recorded channel traffic through the autoreply policy")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--trace", help="JSON lines written with ACTIVITY_TRACE")
+    src.add_argument("--db", help="CONVERSATION_DB SQLite file")
+    ap.add_argument("--personas", nargs="*", default=None, help="persona roles (default: all)")
+    ap.add_argument("--budget", type=float, default=0, help="autoreplies per minute (0: half of GEMINI_RPM)")
+    ap.add_argument("--turns", type=int, default=MAX_TURN_REPLIES,
+                    help="autonomous replies per message (0: every persona rolls)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    return ap.parse_args(argv)
+
+
+def load_trace(path):
+    # yields (ts, channel_id, author, persona name or None)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                e = json.loads(line)
+                yield e["ts"], e["channel"], e["author"], e.get("persona")
+
+
+def load_db(path):
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for channel_id, role, ts in db.execute("SELECT channel_id, role, ts FROM messages ORDER BY ts, seq"):
+            yield ts, channel_id, USER_ROLE, None if role == USER_ROLE else role
+    finally:
+        db.close()
+
+
+class SimBot:
+    # a persona's autoreply state, as PersonaBot keeps it
+    def __init__(self, persona, activity):
+        self.persona = persona
+        self.activity = activity
+        self.last = {}      # channel_id -> ts of last autoreply
+        self.recent = {}    # channel_id -> deque of autoreply ts within window
+
+    def cooldown(self, channel_id, now):
+        if self.activity is None:
+            return self.persona.cooldown
+        return self.activity.cooldown(self.persona, channel_id, now)
+
+    def reply_prob(self, channel_id, prob, now):
+        if self.activity is None:
+            return prob
+        return self.activity.reply_prob(prob, channel_id, now)
+
+    def can_autoreply(self, channel_id, now):
+        p = self.persona
+        if now - self.last.get(channel_id, float("-inf")) < self.cooldown(channel_id, now):
+            return False
+        ts = self.recent.get(channel_id)
+        if ts:
+            while ts and now - ts[0] > p.window:
+                ts.popleft()
+            if len(ts) >= p.max_in_window:
+                return False
+        return True
+
+    def record(self, channel_id, now):
+        self.last[channel_id] = now
+        self.recent.setdefault(channel_id, deque()).append(now)
+
+
+def simulate(events, personas, activity, turns, seed):
+    rng = random.Random(seed)
+    bots = [SimBot(p, activity) for p in personas]
+    arbiter = TurnArbiter(turns, rng) if turns > 0 else None
+    size = max(p.recent_size for p in personas)
+    recent = {}       # channel_id -> deque of speaker names
+    traffic = {}      # channel_id -> human messages
+    replies = {}      # channel_id -> autoreplies
+    minutes = {}      # minute index -> autoreplies
+    first = last = None
+    for ts, channel_id, author, persona in events:
+        if persona is not None:
+            continue  # recorded under the old policy; replaced by the simulated replies
+        first = ts if first is None else first
+        last = ts
+        traffic[channel_id] = traffic.get(channel_id, 0) + 1
+        spoken = recent.setdefault(channel_id, deque(maxlen=size))
+        spoken.append(USER_ROLE)
+        if activity is not None:
+            activity.observe(channel_id, author, False, ts)
+
+        def other_bot_spoke(bot):
+            n = bot.persona.recent_size
+            return any(r not in (USER_ROLE, bot.persona.name) for r in list(spoken)[-n:])
+
+        free = [b for b in bots if b.can_autoreply(channel_id, ts)]
+        if arbiter is not None:
+            chosen = arbiter.choose("", free, 0, other_bot_spoke,
+                                    lambda b, prob: b.reply_prob(channel_id, prob, ts))
+        else:
+            chosen = [b for b in free if rng.random() < b.reply_prob(
+                channel_id, b.persona.base_prob + (b.persona.bot_bonus if other_bot_spoke(b) else 0), ts)]
+        for bot in chosen:
+            bot.record(channel_id, ts)
+            spoken.append(bot.persona.name)
+            replies[channel_id] = replies.get(channel_id, 0) + 1
+            minute = int((ts - first) // 60)
+            minutes[minute] = minutes.get(minute, 0) + 1
+            if activity is not None:
+                activity.observe(channel_id, bot.persona.name, True, ts)
+                activity.spend(ts)
+    span = max(1.0, (last - first) / 60) if first is not None else 1.0
+    return traffic, replies, minutes, span
+
+
+def summarize(traffic, replies, minutes, span):
+    # busy half of the channels (by human messages) vs the quiet half
+    ordered = sorted(traffic, key=traffic.get, reverse=True)
+    half = max(1, len(ordered) // 2)
+
+    def per100(channels):
+        msgs = sum(traffic[c] for c in channels)
+        return round(100 * sum(replies.get(c, 0) for c in channels) / max(1, msgs), 2)
+
+    per_minute = sorted(minutes.get(m, 0) for m in range(int(span) + 1))
+    total = sum(replies.values())
+    return {
+        "autoreplies": total,
+        "per_min": round(total / span, 3),
+        "p95_per_min": per_minute[min(len(per_minute) - 1, int(0.95 * len(per_minute)))],
+        "max_per_min": per_minute[-1],
+        "busy_per_100_msgs": per100(ordered[:half]),
+        "quiet_per_100_msgs": per100(ordered[half:]) if len(ordered) > 1 else None,
+        "channels_replied": sum(1 for c in traffic if replies.get(c)),
+    }
+
+
+def run(args):
+    personas = [PERSONAS[r] for r in args.personas] if args.personas else list(PERSONAS.values())
+    events = list(load_trace(args.trace) if args.trace else load_db(args.db))
+    events.sort(key=lambda e: e[0])
+    report = {"config": {k: v for k, v in vars(args).items() if k != "json"}}
+    activity = ActivityModel(args.budget)
+    for name, model in (("fixed", None), ("adaptive", activity)):
+        traffic, replies, minutes, span = simulate(events, personas, model, args.turns, args.seed)
+        report[name] = summarize(traffic, replies, minutes, span)
+    report["budget_per_min"] = activity.budget
+    report["human_messages"] = sum(traffic.values())
+    report["channels"] = len(traffic)
+    report["minutes"] = round(span, 1)
+    return report
+
+
+def print_report(report):
+    print(f"{report['human_messages']} human messages in {report['channels']} channels "
+          f"over {report['minutes']} min; budget {report['budget_per_min']} autoreplies/min")
+    for name in ("fixed", "adaptive"):
+        r = report[name]
+        print(f"{name:9} {r['autoreplies']} autoreplies ({r['per_min']}/min, p95 {r['p95_per_min']}, "
+              f"max {r['max_per_min']}), per 100 msgs busy {r['busy_per_100_msgs']} / quiet "
+              f"{r['quiet_per_100_msgs']}, {r['channels_replied']} channels replied in")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
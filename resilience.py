@@ -0,0 +1,162 @@
+# resilience.py
+# Failure handling around Gemini calls:
+#   - a deadline per request (by priority) that every attempt has to fit in
+#   - jittered exponential retries for transient errors (5xx, timeouts, empty replies)
+#   - optional hedging for mentions: a second request once the first has taken
+#     longer than the recent p95 latency; the first success wins
+#   - a circuit breaker that pauses autonomous replies, periodic_initiator and
+#     summaries while the API is failing; mentions still go through and act as probes
+import time
+import random
+import asyncio
+from collections import deque
+
+from metrics import METRICS
+from quota import AUTOREPLY, INITIATOR, MENTION, SUMMARY, QuotaExceeded, is_quota_error
+
+DEADLINE = {MENTION: 45, AUTOREPLY: 30, INITIATOR: 30, SUMMARY: 60}  # seconds per request, all attempts
+RETRIES = 2               # extra attempts after a transient failure
+RETRY_BASE = 0.5          # seconds, first backoff ceiling; doubles per attempt
+RETRY_MAX = 8
+LATENCY_SAMPLES = 200     # recent successful call latencies kept for the p95
+HEDGE_MIN_SAMPLES = 20    # no hedging until the p95 means something
+HEDGE_MIN_DELAY = 1.0     # seconds
+
+BREAKER_WINDOW = 60       # seconds of call outcomes considered
+BREAKER_MIN_CALLS = 6
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_COOLDOWN = 30     # seconds open before autonomous traffic is let through again
+BREAKER_COOLDOWN_MAX = 300
+
+_TRANSIENT_NAMES = {
+    "GenerationTimeout", "EmptyResponse", "TimeoutError", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "Aborted", "Unknown", "ServerDisconnectedError", "ClientConnectionError",
+    "ClientConnectorError", "ConnectionError", "ConnectionResetError",
+}
+_TRANSIENT_TEXT = ("500", "502", "503", "504", "OVERLOADED", "UNAVAILABLE", "INTERNAL ERROR", "TRY AGAIN")
+
+
+class EmptyResponse(Exception):
+    pass
+
+
+def is_transient(e):
+    # worth retrying as is: server-side and network trouble, not quota, auth or bad requests
+    if isinstance(e, QuotaExceeded) or is_quota_error(e):
+        return False
+    if type(e).__name__ in _TRANSIENT_NAMES or isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    text = str(e).upper()
+    return any(k in text for k in _TRANSIENT_TEXT)
+
+
+def is_degraded(e):
+    # failures that say the API itself is in trouble (counted by the circuit breaker)
+    return is_transient(e) or is_quota_error(e)
+
+
+def retry_delay(attempt, rng=random):
+    # "full jitter": uniform over [0, min(max, base * 2^attempt)]
+    return rng.uniform(0, min(RETRY_MAX, RETRY_BASE * (2 ** attempt)))
+
+
+class LatencyTracker:
+    def __init__(self, size=LATENCY_SAMPLES):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def p95(self):
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_delay(self):
+        p95 = self.p95()
+        return None if p95 is None else max(HEDGE_MIN_DELAY, p95)
+
+
+async def hedged(call, delay):
+    # runs call(); if it is still running after `delay` seconds, races a second call().
+    # The first success wins and the other is cancelled; fails only if both fail.
+    tasks = {asyncio.ensure_future(call())}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                METRICS.inc("hedged_requests_total")
+                tasks.add(asyncio.ensure_future(call()))
+        error = None
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self._events = deque()   # (monotonic time, ok)
+        self._failures = 0
+        self.stats = {"trips": 0, "blocked": 0}
+
+    def _trim(self, now):
+        events = self._events
+        while events and now - events[0][0] > BREAKER_WINDOW:
+            if not events.popleft()[1]:
+                self._failures -= 1
+
+    def record(self, ok):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            if ok:
+                self._close()
+            else:
+                self._open(now, self.cooldown * 2)
+            return
+        self._events.append((now, ok))
+        if not ok:
+            self._failures += 1
+        self._trim(now)
+        n = len(self._events)
+        if self.state == self.CLOSED and n >= BREAKER_MIN_CALLS and self._failures / n >= BREAKER_FAILURE_RATE:
+            self._open(now, BREAKER_COOLDOWN)
+
+    def _open(self, now, cooldown):
+        self.state = self.OPEN
+        self.cooldown = min(BREAKER_COOLDOWN_MAX, cooldown)
+        self.open_until = now + self.cooldown
+        self.stats["trips"] += 1
+        print(f"Circuit breaker open for {self.cooldown:.0f}s: Gemini is failing")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.cooldown = BREAKER_COOLDOWN
+        self._events.clear()
+        self._failures = 0
+        print("Circuit breaker closed")
+
+    def allow(self, priority):
+        # mentions always pass; everything else waits out an open breaker
+        if priority == MENTION or self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() < self.open_until:
+                self.stats["blocked"] += 1
+                return False
+            # let traffic through again; the next outcome closes or re-opens it
+            self.state = self.HALF_OPEN
+        return True
@@ -0,0 +1,150 @@
+# respcache.py
+# Response cache for FAQ-style traffic. Replies are keyed by persona and the
+# normalized user text. Messages that lean on the surrounding conversation
+# (short or deictic: "それ", "さっきの", ...) also key on a fingerprint of the
+# recent channel history, so they only hit when the context is the same.
+# The optional near-duplicate tier matches reworded questions with MinHash
+# over character 3-grams, looked up through LSH bands.
+import re
+import time
+import random
+import hashlib
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_TTL = 6 * 3600    # seconds a cached reply stays valid
+MAX_ENTRIES = 2000
+CONTEXT_ENTRIES = 3       # history entries folded into the fingerprint
+MIN_STANDALONE = 12       # shorter texts are treated as context-dependent
+DEICTIC = ("それ", "これ", "あれ", "その", "この", "あの", "さっき", "今の", "上の", "続き", "どう思")
+
+NUM_PERM = 32
+BANDS = 8                 # NUM_PERM / BANDS rows per band
+NEAR_THRESHOLD = 0.8      # estimated Jaccard similarity for a near-duplicate hit
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5eed)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_MENTION = re.compile(r"<[@#][!&]?\d+>")
+_SPACE = re.compile(r"\s+")
+_TRAILING = "?!。.、,〜~"  # after NFKC
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _MENTION.sub(" ", text)
+    return _SPACE.sub(" ", text).strip().rstrip(_TRAILING).strip()
+
+
+def fingerprint(hist):
+    h = hashlib.blake2b(digest_size=8)
+    for e in hist:
+        h.update(f"{e.role}\x1f{e.content}\x1e".encode())
+    return h.hexdigest()
+
+
+def minhash(text):
+    shingles = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles]
+    return tuple(min((a * x + b) % _PRIME for x in hashes) for a, b in _PERMS)
+
+
+def similarity(sig_a, sig_b):
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class CachedReply:
+    __slots__ = ("reply", "expires", "sig", "bands")
+
+    def __init__(self, reply, expires, sig, bands):
+        self.reply = reply
+        self.expires = expires
+        self.sig = sig
+        self.bands = bands
+
+
+class ResponseCache:
+    def __init__(self, near=False, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.near = near
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> CachedReply, least recently used first
+        self._bands = {}               # band key -> set of keys
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+    def key(self, persona, user_text, hist):
+        # hist: entries before the user's message; returns None (bypass) for empty text
+        text = normalize(user_text)
+        if not text:
+            return None
+        scope = None
+        if len(text) < MIN_STANDALONE or any(w in text for w in DEICTIC):
+            scope = fingerprint(hist)
+        return (persona, scope, text)
+
+    def get(self, key):
+        if key is None:
+            self.stats["bypassed"] += 1
+            return None
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > now:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry.reply
+        if entry is not None:
+            self._remove(key)
+        if self.near:
+            reply = self._near(key, now)
+            if reply is not None:
+                self.stats["near_hits"] += 1
+                return reply
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, reply):
+        if key is None:
+            return
+        if key in self._entries:
+            self._remove(key)
+        sig, bands = None, ()
+        if self.near:
+            sig = minhash(key[2])
+            bands = self._band_keys(key, sig)
+            for b in bands:
+                self._bands.setdefault(b, set()).add(key)
+        self._entries[key] = CachedReply(reply, time.time() + self.ttl, sig, bands)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _band_keys(self, key, sig):
+        rows = NUM_PERM // BANDS
+        return [(key[0], key[1], i, sig[i * rows:(i + 1) * rows]) for i in range(BANDS)]
+
+    def _near(self, key, now):
+        sig = minhash(key[2])
+        candidates = set()
+        for b in self._band_keys(key, sig):
+            candidates |= self._bands.get(b, set())
+        best, best_sim = None, NEAR_THRESHOLD
+        for k in candidates:
+            entry = self._entries[k]
+            if entry.expires <= now:
+                continue
+            sim = similarity(sig, entry.sig)
+            if sim >= best_sim:
+                best, best_sim = k, sim
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        return self._entries[best].reply
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for b in entry.bands:
+            keys = self._bands.get(b)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[b]
@@ -0,0 +1,771 @@
+# runtime.py
+# Hosts every persona's Discord client on one event loop, sharing one
+# Gemini model handle and one message-ingest path.
+#   python runtime.py                 -> all personas
+#   python runtime.py engineer thinker
+# With SHARD_COUNT set the clients are AutoShardedClients and per-channel state
+# is partitioned by guild shard; launcher.py spreads shards over processes.
+import time
+
+PROCESS_START = time.perf_counter()  # startup phases are measured from here
+
+import os
+import sys
+import random
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+
+import aiohttp
+import discord
+from dotenv import load_dotenv
+
+from activity import ActivityModel, TraceWriter
+from arbiter import TurnArbiter, MAX_TURN_REPLIES
+from batch import TurnBatcher
+from coalesce import Coalescer
+from generation import AsyncGenerator, GenerationTimeout, LazyGemini
+from ipc import open_quota
+from metrics import METRICS, SIZE_BUCKETS, start_exporters
+from outbox import Delivery, Outbox
+from pernona import PERSONAS
+from prefix_cache import PrefixCache
+from prompt import PromptBuilder
+from respcache import ResponseCache, CONTEXT_ENTRIES
+from quota import AUTOREPLY, INITIATOR, MENTION, is_quota_error
+from resilience import (DEADLINE, RETRIES, CircuitBreaker, EmptyResponse, LatencyTracker,
+                        hedged, is_degraded, is_transient, retry_delay)
+from scheduler import ChannelScheduler, PermissionIndex
+from sharding import ShardPlan
+from store import open_store
+from streaming import StreamingMessage, chunk_text
+from summarize import Summarizer
+
+load_dotenv()
+GEN_API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_NAME = "gemini-2.5-flash"
+# off | system | cached: register persona prompts with Gemini instead of resending them
+PREFIX_CACHE = os.getenv("PREFIX_CACHE", "off")
+PREFIX_CACHE_TTL = int(os.getenv("PREFIX_CACHE_TTL", "3600"))
+# seconds of quiet that close a burst of messages in a channel, e.g. 1.5 (0: no coalescing;
+# off by default since the window delays every mention reply)
+COALESCE = float(os.getenv("COALESCE_WINDOW", "0"))
+# off | mentions | all: post replies while they are generated and edit them as text arrives
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "off")
+# off | exact | near: reuse replies to repeated (or, with near, reworded) questions
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "off")
+# autonomous replies allowed per user message, picked by the turn arbiter (0: every persona rolls)
+TURN_REPLIES = int(os.getenv("TURN_REPLIES", MAX_TURN_REPLIES))
+# off | on: personas answering the same message share one JSON-structured Gemini call
+BATCH_REPLIES = os.getenv("BATCH_REPLIES", "off")
+# off | on: fold older history into a rolling per-channel summary in the background
+SUMMARIES = os.getenv("SUMMARIES", "off")
+# off | on: race a second request for a mention that outlives the recent p95 latency
+HEDGE_MENTIONS = os.getenv("HEDGE_MENTIONS", "off") == "on"
+# on | off: queue posts per channel (mentions first, paced to Discord's buckets, short posts merged)
+SEND_QUEUE = os.getenv("SEND_QUEUE", "on")
+# off | on: scale reply probability and cooldowns by channel activity, steered toward ACTIVITY_BUDGET
+ACTIVITY = os.getenv("ACTIVITY", "off")
+ACTIVITY_BUDGET = float(os.getenv("ACTIVITY_BUDGET", "0"))   # autoreplies per minute (0: half of GEMINI_RPM)
+ACTIVITY_TRACE = os.getenv("ACTIVITY_TRACE")                  # path: record traffic for replay.py
+
+USER_ROLE = "ユーザー"
+SEEN_MESSAGES = 1024   # message ids remembered so each message is dispatched once
+PRUNE_EVERY = 500      # autoreplies between sweeps of idle rate-limit state
+PERSONA_NAMES = {p.name for p in PERSONAS.values()}
+
+
+def split_persona_reply(content):
+    # persona replies are posted as "**[name]** text"
+    if content.startswith("**["):
+        name, sep, text = content[3:].partition("]** ")
+        if sep and name in PERSONA_NAMES:
+            return name, text
+    return None, None
+
+
+class PersonaBot:
+    def __init__(self, runtime, persona, token, generator, connector, client=None):
+        self.runtime = runtime
+        self.persona = persona
+        self.token = token
+        self.generator = generator
+        self.prompt_builder = PromptBuilder(persona)
+        self.header = f"**[{persona.name}]** "
+        self.scheduler = ChannelScheduler()
+        self.permissions = PermissionIndex()
+        self.coalescer = Coalescer(self.flush, window=COALESCE) if COALESCE > 0 else None
+        self._initiations = set()
+        self.last_autoreply = {}    # channel_id -> timestamp of last auto msg
+        self.autoreply_counts = {}  # channel_id -> deque of timestamps (for windowed limit)
+        self._restored = set()      # channels whose autoreply state was read back from the store
+        self._records = 0
+
+        if client is None:
+            intents = discord.Intents.default()
+            intents.message_content = True
+            shards = runtime.shards
+            if shards is None:
+                client = discord.Client(intents=intents, connector=connector)
+            else:
+                client = discord.AutoShardedClient(intents=intents, connector=connector,
+                                                   shard_count=shards.count, shard_ids=shards.ids)
+        self.client = client  # loadtest.py passes a fake gateway client here
+        self.client.setup_hook = self.setup_hook
+        self.client.event(self.on_ready)
+        self.client.event(self.on_message)
+        for name in ("on_guild_channel_create", "on_guild_channel_delete", "on_guild_channel_update",
+                     "on_guild_role_create", "on_guild_role_delete", "on_guild_role_update",
+                     "on_guild_remove", "on_member_update"):
+            self.client.event(self._permission_handler(name))
+
+    # --- discord events ---
+    async def setup_hook(self):
+        # バックグラウンドタスクを開始
+        self.client.loop.create_task(self.periodic_initiator())
+
+    async def on_ready(self):
+        print(f"{self.persona.role} ready as {self.client.user}")
+        self.runtime.bot_ready(self)
+
+    async def on_message(self, message):
+        with METRICS.timer("on_message_seconds"):
+            await self.runtime.ingest(message)
+
+    def _permission_handler(self, name):
+        # guild/role/channel changes may change what we can post; drop that guild's cache
+        async def handler(*args):
+            obj = args[-1]
+            if name == "on_member_update" and obj.id != self.client.user.id:
+                return
+            guild = obj if name == "on_guild_remove" else obj.guild
+            self.permissions.invalidate(guild.id)
+        handler.__name__ = name
+        return handler
+
+    # --- rate-limits ---
+    def can_autoreply(self, channel_id):
+        p = self.persona
+        now = time.time()
+        if channel_id not in self._restored:
+            self.restore_autoreply(channel_id, now)
+        if now - self.last_autoreply.get(channel_id, 0) < self.cooldown(channel_id, now):
+            return False
+        ts = self.autoreply_counts.get(channel_id)
+        if ts:
+            while ts and now - ts[0] > p.window:
+                ts.popleft()
+            if len(ts) >= p.max_in_window:
+                return False
+        return True
+
+    def cooldown(self, channel_id, now):
+        activity = self.runtime.activity
+        if activity is None:
+            return self.persona.cooldown
+        return activity.cooldown(self.persona, channel_id, now)
+
+    def reply_prob(self, channel_id, prob):
+        # prob (base_prob and bonuses), or what the activity model makes of it in this channel
+        activity = self.runtime.activity
+        if activity is None:
+            return prob
+        return activity.reply_prob(prob, channel_id, time.time())
+
+    def restore_autoreply(self, channel_id, now):
+        # warm restart: pick up cooldowns recorded before the last restart
+        # once per channel: from then on this bot's own records are the whole state
+        p = self.persona
+        self._restored.add(channel_id)
+        ts = self.runtime.store.autoreply_times(p.role, channel_id, now - max(p.cooldown, p.window))
+        if ts:
+            self.last_autoreply[channel_id] = ts[-1]
+            self.autoreply_counts[channel_id] = deque(ts)
+
+    def record_autoreply(self, channel_id):
+        now = time.time()
+        self.last_autoreply[channel_id] = now
+        self.autoreply_counts.setdefault(channel_id, deque()).append(now)
+        self.runtime.store.record_autoreply(self.persona.role, channel_id, now)
+        self.scheduler.defer(channel_id, now + self.cooldown(channel_id, now))
+        if self.runtime.activity is not None:
+            self.runtime.activity.spend(now)
+        self._records += 1
+        if self._records % PRUNE_EVERY == 0:
+            self.prune_autoreply(now)
+
+    def prune_autoreply(self, now):
+        # drop channels whose cooldown and window have both passed
+        p = self.persona
+        for channel_id, last in list(self.last_autoreply.items()):
+            if now - last > max(p.cooldown, p.window):
+                del self.last_autoreply[channel_id]
+                self.autoreply_counts.pop(channel_id, None)
+
+    # --- generation ---
+    def build_prompt(self, channel_id, user_text):
+        # returns (parts after the persona prefix, estimated tokens)
+        builder = self.prompt_builder
+        role = self.persona.role
+        with METRICS.timer("build_prompt_seconds", persona=role):
+            hist = self.runtime.recent(channel_id, self.persona.history_size)
+            parts, tokens = builder.body(hist, user_text, self.runtime.summary(channel_id))
+        METRICS.observe("prompt_chars", len(builder.prefix) + sum(map(len, parts)), SIZE_BUCKETS, persona=role)
+        METRICS.observe("prompt_tokens", builder.prefix_tokens + tokens, SIZE_BUCKETS, persona=role)
+        return parts, tokens
+
+    async def acquire_quota(self, priority, tokens):
+        with METRICS.timer("quota_wait_seconds", priority=priority):
+            return await self.runtime.quota.acquire(priority, tokens)
+
+    async def request(self, channel_id, user_text, priority):
+        # transient failures are retried with jittered backoff inside the priority's
+        # deadline; a mention may be hedged once it outlives the recent p95 latency
+        builder = self.prompt_builder
+        parts, tokens = self.build_prompt(channel_id, user_text)
+        return await self.call(lambda timeout: self._request(builder, parts, timeout),
+                               builder.prefix_tokens + tokens, priority)
+
+    async def call(self, send, tokens, priority, deadline=None, label=None):
+        # send(timeout) -> response, retried and hedged as request() describes;
+        # label names the call in llm_latency_seconds (default: this persona)
+        deadline = deadline or time.monotonic() + DEADLINE[priority]
+        hedge = HEDGE_MENTIONS and priority == MENTION
+
+        def attempt():
+            return self.attempt(send, tokens, priority, deadline, label)
+
+        for n in range(RETRIES + 1):
+            try:
+                if hedge:
+                    return await hedged(attempt, self.runtime.latency.hedge_delay())
+                return await attempt()
+            except Exception as e:
+                delay = retry_delay(n)
+                if n == RETRIES or not is_transient(e) or time.monotonic() + delay >= deadline:
+                    raise
+                METRICS.inc("generate_retries_total", persona=self.persona.role, error=type(e).__name__)
+                print(f"Retrying {self.persona.role} in {delay:.1f}s: {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+    async def attempt(self, send, tokens, priority, deadline, label=None):
+        # one API request: quota, the call, and its outcome for the breaker and the p95
+        runtime = self.runtime
+        charged = await self.acquire_quota(priority, tokens)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise GenerationTimeout("deadline passed while waiting for quota")
+        started = time.perf_counter()
+        try:
+            with METRICS.timer("llm_latency_seconds", persona=label or self.persona.role):
+                resp = await send(min(remaining, self.generator.timeout))
+            if not resp or not resp.text:
+                raise EmptyResponse("Empty text response from Gemini API")
+        except Exception as e:
+            runtime.breaker.record(not is_degraded(e))
+            raise
+        runtime.breaker.record(True)
+        runtime.latency.observe(time.perf_counter() - started)
+        runtime.quota.settle(charged, resp)
+        return resp
+
+    async def _request(self, builder, parts, timeout=None):
+        cache = self.runtime.prefix_cache
+        if cache is not None:
+            model, kind = await cache.model_for(self.persona)
+            try:
+                resp = await self.generator.generate("".join(parts).lstrip("\n"), timeout, model=model)
+            except GenerationTimeout:
+                raise
+            except Exception as e:
+                # e.g. the cache expired server-side; drop it and resend the full prompt once
+                print(f"Prefix cache request failed ({self.persona.role}): {type(e).__name__}: {e}")
+                cache.invalidate(self.persona)
+            else:
+                cache.record(kind, builder.prefix_tokens, resp)
+                return resp
+        return await self.generator.generate("".join([builder.prefix, *parts]), timeout)
+
+    async def generate(self, channel_id, user_text, priority=AUTOREPLY):
+        try:
+            resp = await self.request(channel_id, user_text, priority)
+            return resp.text.strip()
+        except Exception as e:
+            raise self.api_error(e)
+
+    def api_error(self, e):
+        print(f"Error in generate ({self.persona.role}): {type(e).__name__}: {e}")
+        METRICS.inc("generate_errors_total", persona=self.persona.role, error=type(e).__name__)
+        if is_quota_error(e):
+            self.runtime.quota.throttled()
+
+        # APIキー関連のエラーを特別に処理
+        if "API_KEY" in str(e).upper() or "AUTHENTICATION" in str(e).upper():
+            return Exception("API認証エラー: APIキーを確認してください")
+        elif "QUOTA" in str(e).upper() or "LIMIT" in str(e).upper():
+            return Exception("API使用量制限エラー: 制限を確認してください")
+        elif "MODEL" in str(e).upper():
+            return Exception("モデルエラー: モデル名を確認してください")
+        else:
+            return Exception(f"API呼び出しエラー: {str(e)}")
+
+    def streams(self, priority):
+        return STREAM_REPLIES == "all" or (STREAM_REPLIES == "mentions" and priority == MENTION)
+
+    async def stream_reply(self, channel, user_text, burst=None, priority=MENTION):
+        builder = self.prompt_builder
+        parts, tokens = self.build_prompt(channel.id, user_text)
+        out = StreamingMessage(channel, self.header, send=lambda content: self.send(channel, content, priority))
+        role = self.persona.role
+        runtime = self.runtime
+        deadline = time.monotonic() + DEADLINE[priority]
+        try:
+            quota = runtime.quota
+            cache = runtime.prefix_cache
+            if cache is not None:
+                model, kind = await cache.model_for(self.persona)
+                prompt = "".join(parts).lstrip("\n")
+            else:
+                model, kind = None, None
+                prompt = "".join([builder.prefix, *parts])
+            for n in range(RETRIES + 1):
+                charged = await self.acquire_quota(priority, builder.prefix_tokens + tokens)
+                last = None
+                started = time.perf_counter()
+                try:
+                    timeout = max(0.1, min(deadline - time.monotonic(), self.generator.timeout))
+                    async for chunk in self.generator.stream(prompt, timeout, model=model):
+                        if last is None:
+                            METRICS.observe("llm_first_chunk_seconds", time.perf_counter() - started, persona=role)
+                        last = chunk
+                        text = chunk_text(chunk)
+                        if text:
+                            if burst is not None:
+                                burst.sending = True  # already visible; must not be cancelled
+                            await out.feed(text)
+                    reply = await out.finish()
+                    if not reply:
+                        raise EmptyResponse("Empty text response from Gemini API")
+                except Exception as e:
+                    runtime.breaker.record(not is_degraded(e))
+                    delay = retry_delay(n)
+                    # only a stream that produced nothing can be restarted
+                    if (last is not None or n == RETRIES or not is_transient(e)
+                            or time.monotonic() + delay >= deadline):
+                        raise
+                    METRICS.inc("generate_retries_total", persona=role, error=type(e).__name__)
+                    await asyncio.sleep(delay)
+                    continue
+                runtime.breaker.record(True)
+                break
+            METRICS.observe("llm_latency_seconds", time.perf_counter() - started, persona=role)
+            quota.settle(charged, last)
+            if cache is not None:
+                cache.record(kind, builder.prefix_tokens, last)
+        except Exception as e:
+            raise self.api_error(e)
+        # the gateway echo of these messages is skipped: own replies are logged here
+        self.runtime.add_log(channel.id, self.persona.name, reply, message_id=out.messages[0].id)
+        return reply
+
+    def cache_key(self, channel_id, user_text):
+        # the user's message is already the newest log entry; fingerprint what came before it
+        hist = list(self.runtime.recent(channel_id, CONTEXT_ENTRIES + 1))[:-1]
+        return self.runtime.response_cache.key(self.persona.role, user_text, hist)
+
+    async def post(self, channel, content, priority, merge=False):
+        # returns a Delivery; merge: may share one message with adjacent short posts of ours
+        outbox = self.runtime.outbox
+        if outbox is not None:
+            return await outbox.post(self, channel, content, priority, merge)
+        with METRICS.timer("discord_send_seconds", persona=self.persona.role):
+            return Delivery(await channel.send(content))
+
+    async def send(self, channel, content, priority):
+        return (await self.post(channel, content, priority)).message
+
+    async def reply(self, channel, user_text, burst=None, priority=AUTOREPLY):
+        cache = self.runtime.response_cache
+        batcher = self.runtime.batcher
+        key = reply = turn = None
+        # initiator seeds are fixed strings; caching them would repeat the same post
+        if cache is not None and priority != INITIATOR:
+            key = self.cache_key(channel.id, user_text)
+            reply = cache.get(key)
+        if reply is None:
+            if self.streams(priority):
+                reply = await self.stream_reply(channel, user_text, burst, priority)
+                if cache is not None:
+                    cache.put(key, reply)
+                return
+            if batcher is not None and priority != INITIATOR:
+                reply, turn = await batcher.generate(self, channel.id, user_text, priority)
+            else:
+                reply = await self.generate(channel.id, user_text, priority)
+            if cache is not None:
+                cache.put(key, reply)
+        if burst is not None:
+            burst.sending = True  # newer input must not cancel a half-sent reply
+        # a batched reply waits for the personas the model answered as before it
+        async with turn or contextlib.nullcontext():
+            sent = await self.post(channel, self.header + reply, priority, merge=True)
+            # logged here rather than from the gateway echo (ingest skips our own messages);
+            # a post merged into an earlier one shares its message id, which only that one keeps
+            self.runtime.add_log(channel.id, self.persona.name, reply,
+                                 message_id=None if sent.merged else sent.message.id)
+
+    # --- behaviour ---
+    async def handle_message(self, message, chosen=None):
+        # chosen: bots the turn arbiter gave this message to (None: roll base_prob here)
+        # the ingesting client may differ from ours; skip channels this bot cannot see
+        channel = self.client.get_channel(message.channel.id)
+        if channel is None:
+            return
+        mentioned = self.client.user in message.mentions
+        turn = None if chosen is None else self in chosen
+        if self.coalescer is not None:
+            self.coalescer.submit(channel, message, mentioned, turn)
+        else:
+            await self.respond(channel, message.content, mentioned, turn=turn)
+
+    async def flush(self, burst):
+        # one reply (at most) for a whole burst of messages
+        await self.respond(burst.channel, burst.text(), burst.mentioned, burst, burst.chosen)
+
+    def other_bot_spoke(self, channel_id):
+        p = self.persona
+        recent = self.runtime.recent(channel_id, p.recent_size)
+        return any(h.role not in (USER_ROLE, p.name) for h in recent)
+
+    async def respond(self, channel, content, mentioned, burst=None, turn=None):
+        p = self.persona
+        channel_id = channel.id
+
+        # If mentioned explicitly -> respond
+        if mentioned:
+            METRICS.inc("mentions_total", persona=p.role)
+            try:
+                await self.reply(channel, content, burst, MENTION)
+            except Exception as e:
+                METRICS.inc("reply_failures_total", persona=p.role, kind="mention")
+                error_details = str(e)
+                print(f"Error in {p.role} bot: {type(e).__name__}: {e}")
+
+                # ユーザーフレンドリーなエラーメッセージ
+                if "API認証エラー" in error_details:
+                    await self.send(channel, "申し訳ありません。API認証に問題があります。管理者にお知らせください。", MENTION)
+                elif "使用量制限" in error_details:
+                    await self.send(channel, "申し訳ありません。現在API使用量制限に達しています。しばらくお待ちください。", MENTION)
+                elif "モデルエラー" in error_details:
+                    await self.send(channel, "申し訳ありません。AIモデルの設定に問題があります。管理者にお知らせください。", MENTION)
+                else:
+                    await self.send(channel, f"申し訳ありません。返答中にエラーが発生しました。({error_details[:50]}...)", MENTION)
+            return
+
+        # Otherwise consider autonomous response
+        if not self.runtime.breaker.allow(AUTOREPLY):
+            METRICS.inc("autoreply_decisions_total", persona=p.role, decision="circuit_open")
+            return
+        # a burst superseded by newer input has already rolled (and reserved its slot)
+        decided = burst is not None and burst.replying
+        if not decided:
+            if turn is None:
+                base_prob = p.base_prob
+                # increase probability if other bots recently spoke
+                if self.other_bot_spoke(channel_id):
+                    base_prob += p.bot_bonus
+                base_prob = self.reply_prob(channel_id, base_prob)
+                if random.random() >= base_prob:
+                    METRICS.inc("autoreply_decisions_total", persona=p.role, decision="skipped")
+                    return
+            elif not turn:
+                METRICS.inc("autoreply_decisions_total", persona=p.role, decision="not_chosen")
+                return
+            if not self.can_autoreply(channel_id):
+                METRICS.inc("autoreply_decisions_total", persona=p.role, decision="rate_limited")
+                return
+            METRICS.inc("autoreply_decisions_total", persona=p.role, decision="taken")
+            self.record_autoreply(channel_id)
+            if burst is not None:
+                burst.replying = True
+        try:
+            await self.reply(channel, content, burst)
+        except Exception as e:
+            METRICS.inc("reply_failures_total", persona=p.role, kind="autoreply")
+            print(f"Error in {p.role} auto-reply: {type(e).__name__}: {e}")
+
+    def initiator_delay(self):
+        p = self.persona
+        return p.initiator_delay + random.random() * p.initiator_jitter
+
+    def note_activity(self, channel_id):
+        self.scheduler.touch(channel_id, self.initiator_delay())
+
+    async def periodic_initiator(self):
+        # only recently active channels are queued (see note_activity); each one
+        # gets a roll of initiator_prob every initiator_delay(+jitter) seconds
+        p = self.persona
+        client = self.client
+        await client.wait_until_ready()
+        while not client.is_closed():
+            channel_id = await self.scheduler.next_due()
+            with METRICS.timer("initiator_tick_seconds", persona=p.role):
+                self.initiator_tick(channel_id)
+
+    def initiator_tick(self, channel_id):
+        p = self.persona
+        channel = self.client.get_channel(channel_id)
+        try:
+            allowed = channel is not None and self.permissions.can_send(channel)
+        except Exception as e:
+            print(f"Error in {p.role} initiator: {type(e).__name__}: {e}")
+            allowed = False
+        if not allowed:
+            # dropped until the next activity
+            self.scheduler.discard(channel_id)
+            return
+        self.scheduler.schedule(channel_id, time.time() + self.initiator_delay())
+        if not self.runtime.breaker.allow(INITIATOR):
+            return  # the API is failing; try again next round
+        if random.random() < p.initiator_prob and self.can_autoreply(channel_id):
+            METRICS.inc("initiator_seeds_total", persona=p.role)
+            self.record_autoreply(channel_id)
+            task = asyncio.create_task(self.initiate(channel))
+            self._initiations.add(task)
+            task.add_done_callback(self._initiations.discard)
+
+    async def initiate(self, channel):
+        try:
+            await self.reply(channel, self.persona.seed, priority=INITIATOR)
+        except Exception as e:
+            METRICS.inc("reply_failures_total", persona=self.persona.role, kind="initiator")
+            print(f"Error in {self.persona.role} initiator: {type(e).__name__}: {e}")
+
+
+class Runtime:
+    def __init__(self, personas, store=None, shards=None, quota=None):
+        self.personas = personas
+        self.bots = []
+        self.shards = shards    # ShardPlan, or None for one unsharded client per persona
+        if store is None and shards is not None and shards.partitioned:
+            store = open_store(shards.ids, self.shard_of)
+        self.store = store or open_store()
+        self.prefix_cache = None
+        self.quota = quota or open_quota()
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.gemini = None
+        self.startup = {}      # phase -> seconds since process start
+        self._warmup = None
+        self.arbiter = TurnArbiter(TURN_REPLIES) if TURN_REPLIES > 0 else None
+        self.batcher = TurnBatcher(self) if BATCH_REPLIES == "on" else None
+        self.summarizer = Summarizer(self) if SUMMARIES == "on" else None
+        self.outbox = Outbox() if SEND_QUEUE == "on" else None
+        self.response_cache = ResponseCache(near=RESPONSE_CACHE == "near") if RESPONSE_CACHE != "off" else None
+        self.activity = ActivityModel(ACTIVITY_BUDGET) if ACTIVITY == "on" else None
+        self.trace = TraceWriter(ACTIVITY_TRACE) if ACTIVITY_TRACE else None
+        self._seen = OrderedDict()  # message id -> None
+
+    # --- memory ---
+    def shard_of(self, channel_id):
+        # the clients' caches know every channel of our shards; unknown ones go to our first shard
+        for bot in self.bots:
+            channel = bot.client.get_channel(channel_id)
+            guild = getattr(channel, "guild", None)
+            if guild is not None:
+                return self.shards.shard_of(guild.id)
+        return self.shards.ids[0]
+
+    def add_log(self, channel_id, role, content, message_id=None):
+        added = self.store.append(channel_id, role, content, message_id=message_id)
+        if added and self.summarizer is not None:
+            self.summarizer.note(channel_id)
+        return added
+
+    def summary(self, channel_id):
+        return self.summarizer.get(channel_id) if self.summarizer is not None else None
+
+    def recent(self, channel_id, n):
+        return self.store.recent(channel_id, n)
+
+    # --- ingest ---
+    async def ingest(self, message):
+        # every client in the guild receives the same message; handle it once
+        if message.id in self._seen:
+            return
+        self._seen[message.id] = None
+        if len(self._seen) > SEEN_MESSAGES:
+            self._seen.popitem(last=False)
+
+        channel_id = message.channel.id
+        if message.author.bot:
+            own = next((bot for bot in self.bots if bot.client.user == message.author), None)
+            if own is not None:
+                self.observe(message, own.persona.name)
+                return  # logged by the bot that sent it (streamed replies arrive half-written)
+            # replies from personas running in another process join the log
+            name, text = split_persona_reply(message.content)
+            if name:
+                self.observe(message, name)
+                self.add_log(channel_id, name, text, message_id=message.id)
+            return
+        self.observe(message)
+        # only human messages keep a channel on the initiator schedule; persona posts
+        # (initiator seeds included) would keep dead channels alive forever
+        for bot in self.bots:
+            bot.note_activity(channel_id)
+        self.add_log(channel_id, USER_ROLE, message.content, message_id=message.id)
+        chosen = self.arbitrate(message)
+        await asyncio.gather(*(bot.handle_message(message, chosen) for bot in self.bots))
+
+    def observe(self, message, persona=None):
+        # persona: name of the persona that posted it; None for a human
+        if self.activity is None and self.trace is None:
+            return
+        now = time.time()
+        author = message.author.id
+        if self.activity is not None:
+            self.activity.observe(message.channel.id, author, persona is not None, now)
+        if self.trace is not None:
+            self.trace.write(now, message.channel.id, author, persona)
+
+    def arbitrate(self, message):
+        # one turn decision per message for every persona; None leaves it to each bot's roll
+        if self.arbiter is None:
+            return None
+        if not self.breaker.allow(AUTOREPLY):
+            return set()
+        channel_id = message.channel.id
+        mentioned = [b for b in self.bots if b.client.user in message.mentions]
+        free = [b for b in self.bots
+                if b not in mentioned and b.client.get_channel(channel_id) is not None
+                and b.can_autoreply(channel_id)]
+        return self.arbiter.choose(message.content, free, len(mentioned),
+                                   lambda b: b.other_bot_spoke(channel_id), lambda b, prob: b.reply_prob(channel_id, prob))
+
+    # --- lifecycle ---
+    def register_metrics(self):
+        def per_bot(fn):
+            return lambda: {(("persona", bot.persona.role),): fn(bot) for bot in self.bots}
+
+        METRICS.gauge("startup_seconds", lambda: {(("phase", k),): v for k, v in self.startup.items()})
+        if self.gemini is not None:
+            METRICS.gauge("gemini_init_seconds",
+                          lambda: {(("phase", k),): v for k, v in self.gemini.timings.items()})
+        METRICS.gauge("quota_queue_depth", self.quota.queue_depth, "requests waiting for Gemini quota")
+        METRICS.gauge("quota_backoff_seconds", lambda: self.quota.backoff)
+        METRICS.gauge("circuit_state", lambda: self.breaker.state, "0 closed, 1 half-open, 2 open")
+        METRICS.gauge("circuit_breaker", lambda: {(("stat", k),): v for k, v in self.breaker.stats.items()})
+        METRICS.gauge("generations_in_flight", per_bot(lambda b: b.generator.pending()))
+        METRICS.gauge("coalescer_pending", per_bot(lambda b: b.coalescer.pending() if b.coalescer else 0))
+        METRICS.gauge("initiator_queue_channels", per_bot(lambda b: len(b.scheduler)))
+        METRICS.gauge("initiator_tasks", per_bot(lambda b: len(b._initiations)))
+        if self.prefix_cache is not None:
+            METRICS.gauge("prefix_cache", lambda: {(("stat", k),): v for k, v in self.prefix_cache.stats.items()})
+        if self.arbiter is not None:
+            METRICS.gauge("turn_arbiter", lambda: {(("stat", k),): v for k, v in self.arbiter.stats.items()})
+        if self.batcher is not None:
+            METRICS.gauge("batch_replies", lambda: {(("stat", k),): v for k, v in self.batcher.stats.items()})
+        if self.summarizer is not None:
+            METRICS.gauge("summaries", lambda: {(("stat", k),): v for k, v in self.summarizer.stats.items()})
+            METRICS.gauge("summary_queue_channels", self.summarizer.pending)
+        if self.activity is not None:
+            METRICS.gauge("activity", lambda: {(("stat", k),): v for k, v in self.activity.stats(time.time()).items()})
+        if self.outbox is not None:
+            METRICS.gauge("send_queue_depth", self.outbox.depth, "posts waiting to be sent to Discord")
+            METRICS.gauge("send_queue_channels", self.outbox.channels)
+            METRICS.gauge("send_queue", lambda: {(("stat", k),): v for k, v in self.outbox.stats.items()})
+        if self.response_cache is not None:
+            METRICS.gauge("response_cache", lambda: {(("stat", k),): v for k, v in self.response_cache.stats.items()})
+
+    def mark(self, phase):
+        self.startup.setdefault(phase, time.perf_counter() - PROCESS_START)
+
+    def bot_ready(self, bot):
+        self.mark(f"ready:{bot.persona.role}")
+        if self._warmup is None and self.gemini is not None:
+            # the gateway is up; import the SDK and build the model off the loop
+            self._warmup = asyncio.create_task(self.warm_gemini())
+        if all(f"ready:{b.persona.role}" in self.startup for b in self.bots):
+            self.mark("all_ready")
+            self.report_startup()
+
+    async def warm_gemini(self):
+        try:
+            await self.gemini.warm()
+            self.mark("gemini_warm")
+            print("gemini warm: " + ", ".join(f"{k}={v:.2f}s" for k, v in self.gemini.timings.items()))
+        except Exception as e:
+            print(f"Gemini warm-up failed: {type(e).__name__}: {e}")
+
+    def report_startup(self):
+        phases = sorted(self.startup.items(), key=lambda kv: kv[1])
+        print("startup: " + ", ".join(f"{k}={v:.2f}s" for k, v in phases))
+
+    async def run_client(self, bot):
+        # a persona whose client fails (revoked token, fatal gateway close) drops out alone
+        try:
+            await bot.client.start(bot.token)
+        except Exception as e:
+            METRICS.inc("client_failures_total", persona=bot.persona.role, error=type(e).__name__)
+            print(f"{bot.persona.role} client stopped: {type(e).__name__}: {e}")
+            if bot in self.bots:
+                self.bots.remove(bot)
+            bot.generator.cancel_all()
+            if not bot.client.is_closed():
+                await bot.client.close()
+
+    async def start(self):
+        self.mark("imports")
+        if self.shards is not None:
+            print(f"Running {self.shards}")
+        if not GEN_API_KEY:
+            print("Warning: GEMINI_API_KEY not found in environment variables")
+        # nothing Gemini-related is imported until the first generation or the post-ready warm-up
+        self.gemini = LazyGemini(MODEL_NAME, GEN_API_KEY)
+        if PREFIX_CACHE != "off":
+            self.prefix_cache = PrefixCache(MODEL_NAME, PREFIX_CACHE, PREFIX_CACHE_TTL, api=self.gemini)
+
+        for persona in self.personas:
+            token = os.getenv(persona.token_env)
+            if not token:
+                print(f"Warning: {persona.token_env} not found, skipping {persona.role}")
+                continue
+            # one connector per client: discord.py's session owns it and closes it with the client
+            connector = aiohttp.TCPConnector()
+            self.bots.append(PersonaBot(self, persona, token, AsyncGenerator(self.gemini), connector))
+        if not self.bots:
+            raise RuntimeError("no persona has a Discord token configured")
+        self.mark("clients")
+        self.register_metrics()
+        exporters = start_exporters()
+
+        try:
+            await asyncio.gather(*(self.run_client(bot) for bot in list(self.bots)))
+        finally:
+            for task in exporters:
+                task.cancel()
+            if self._warmup is not None:
+                self._warmup.cancel()
+            if self.summarizer is not None:
+                self.summarizer.close()
+            if self.outbox is not None:
+                self.outbox.close()
+            for bot in self.bots:
+                bot.generator.cancel_all()
+                if not bot.client.is_closed():
+                    await bot.client.close()
+            if hasattr(self.quota, "close"):
+                self.quota.close()
+            if self.trace is not None:
+                self.trace.close()
+            self.store.close()
+
+
+def run(roles=None):
+    personas = [PERSONAS[r] for r in roles] if roles else list(PERSONAS.values())
+    asyncio.run(Runtime(personas, shards=ShardPlan.from_env()).start())
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
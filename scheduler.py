@@ -0,0 +1,91 @@
+# scheduler.py
+# Event-driven replacement for walking every text channel on each
+# periodic_initiator tick. Channels enter the queue when they see activity and
+# leave it once they have been idle for ACTIVE_WINDOW; the initiator sleeps
+# until the earliest next-eligible time, so an idle server costs nothing.
+import time
+import heapq
+import asyncio
+
+ACTIVE_WINDOW = 30 * 60   # seconds a channel stays a candidate after its last message
+
+
+class PermissionIndex:
+    # cached send permission per channel; invalidated by guild/role/channel events
+    def __init__(self):
+        self._guilds = {}  # guild_id -> {channel_id: can_send}
+
+    def can_send(self, channel):
+        guild = channel.guild
+        perms = self._guilds.setdefault(guild.id, {})
+        ok = perms.get(channel.id)
+        if ok is None:
+            ok = perms[channel.id] = channel.permissions_for(guild.me).send_messages
+        return ok
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._guilds.clear()
+        else:
+            self._guilds.pop(guild_id, None)
+
+
+class ChannelScheduler:
+    def __init__(self, active_window=ACTIVE_WINDOW):
+        self.active_window = active_window
+        self._heap = []         # (due, channel_id); stale entries are skipped on pop
+        self._due = {}          # channel_id -> current due time
+        self._last_active = {}  # channel_id -> timestamp of last activity
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due)
+
+    def touch(self, channel_id, first_delay, now=None):
+        # record activity; a channel not yet queued becomes due after first_delay
+        now = now or time.time()
+        self._last_active[channel_id] = now
+        if channel_id not in self._due:
+            self.schedule(channel_id, now + first_delay)
+
+    def schedule(self, channel_id, due):
+        self._due[channel_id] = due
+        heapq.heappush(self._heap, (due, channel_id))
+        if self._heap[0][1] == channel_id:
+            self._wakeup.set()
+
+    def defer(self, channel_id, until):
+        # push a queued channel back, e.g. to the end of its autoreply cooldown
+        due = self._due.get(channel_id)
+        if due is not None and due < until:
+            self.schedule(channel_id, until)
+
+    def discard(self, channel_id):
+        self._due.pop(channel_id, None)
+        self._last_active.pop(channel_id, None)
+
+    async def next_due(self):
+        # waits for the next due channel that is still active and returns its id;
+        # the caller reschedules it (or lets it drop out)
+        while True:
+            timeout = None
+            while self._heap:
+                due, channel_id = self._heap[0]
+                if self._due.get(channel_id) != due:
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.time()
+                if due > now:
+                    timeout = due - now
+                    break
+                heapq.heappop(self._heap)
+                del self._due[channel_id]
+                if now - self._last_active.get(channel_id, 0) > self.active_window:
+                    self._last_active.pop(channel_id, None)
+                    continue
+                return channel_id
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,83 @@
+# sharding.py
+# Guild sharding. Discord routes guild g to shard (g >> 22) % shard_count; a
+# process that owns some shard ids only receives events for those guilds, so
+# everything it keeps per channel (history, autoreply limits) belongs to them.
+#   SHARD_COUNT=auto              -> AutoShardedClient, Discord's recommended count, all in this process
+#   SHARD_COUNT=8 SHARD_IDS=0-3   -> shards 0..3 of 8 (launcher.py sets these per worker)
+import os
+
+
+def shard_for(guild_id, count):
+    return (guild_id >> 22) % count
+
+
+def parse_ids(text):
+    # "0-3,6" -> [0, 1, 2, 3, 6]
+    ids = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, sep, hi = part.partition("-")
+        ids.extend(range(int(lo), int(hi) + 1) if sep else [int(lo)])
+    return sorted(set(ids))
+
+
+def format_ids(ids):
+    # inverse of parse_ids, collapsing runs
+    out = []
+    for i in sorted(ids):
+        if out and out[-1][1] == i - 1:
+            out[-1][1] = i
+        else:
+            out.append([i, i])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in out)
+
+
+def split(count, workers):
+    # contiguous shard ranges, as even as possible; a worker never gets none
+    workers = max(1, min(workers, count))
+    size, extra = divmod(count, workers)
+    ranges, start = [], 0
+    for w in range(workers):
+        n = size + (w < extra)
+        ranges.append(list(range(start, start + n)))
+        start += n
+    return ranges
+
+
+class ShardPlan:
+    def __init__(self, count=None, ids=None):
+        # count None: let Discord pick (AutoShardedClient); state is not partitioned
+        self.count = count
+        if count is not None:
+            ids = list(range(count)) if ids is None else sorted(ids)
+            bad = [i for i in ids if not 0 <= i < count]
+            if bad or not ids:
+                raise ValueError(f"shard ids {ids} do not fit shard count {count}")
+        self.ids = ids
+
+    @classmethod
+    def from_env(cls):
+        count = os.getenv("SHARD_COUNT")
+        if not count:
+            return None
+        if count == "auto":
+            return cls()
+        ids = os.getenv("SHARD_IDS")
+        return cls(int(count), parse_ids(ids) if ids else None)
+
+    @property
+    def partitioned(self):
+        return self.count is not None
+
+    def shard_of(self, guild_id):
+        return shard_for(guild_id, self.count)
+
+    def owns(self, guild_id):
+        return self.count is None or self.shard_of(guild_id) in self.ids
+
+    def __repr__(self):
+        if self.count is None:
+            return "ShardPlan(auto)"
+        return f"ShardPlan({format_ids(self.ids)} of {self.count})"
@@ -0,0 +1,245 @@
+# store.py
+# Shared conversation store: one append-only log per channel read by every persona.
+# MemoryStore serves personas in one process; SQLiteStore lets personas running
+# as separate processes on the same host share a log through a local WAL database.
+# PersistentStore keeps MemoryStore's hot path and writes through to SQLite, so
+# history and autoreply rate limits survive restarts; channels are read back
+# lazily on first access. ShardedStore keeps one of these per guild shard.
+import os
+import time
+import sqlite3
+from collections import OrderedDict
+
+from history import Entry, HistoryBook
+
+LOG_SIZE = 60          # entries kept per channel
+SEEN_MESSAGES = 4096   # message ids remembered by MemoryStore for de-duplication
+AUTOREPLY_RETENTION = 3600  # seconds of autoreply timestamps kept on disk
+
+
+class MemoryStore:
+    def __init__(self, log_size=LOG_SIZE):
+        self.log_size = log_size
+        self.history = HistoryBook(log_size)
+        self._seen = OrderedDict()  # message id -> None
+
+    def append(self, channel_id, role, content, ts=None, message_id=None):
+        # returns False when message_id was already recorded
+        if message_id is not None:
+            if message_id in self._seen:
+                return False
+            self._seen[message_id] = None
+            if len(self._seen) > SEEN_MESSAGES:
+                self._seen.popitem(last=False)
+        self.history.append(channel_id, role, content, ts)
+        return True
+
+    def recent(self, channel_id, n):
+        # a view over the ring buffer; do not hold it across appends
+        return self.history.window(channel_id, n)
+
+    # autoreply rate-limit state lives in the persona bots; nothing to persist here
+    def record_autoreply(self, persona, channel_id, ts):
+        pass
+
+    def autoreply_times(self, persona, channel_id, since):
+        return []
+
+    # channel summaries live in summarize.Summarizer; nothing to persist here
+    def summary(self, channel_id):
+        return None
+
+    def save_summary(self, channel_id, text, through):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    def __init__(self, path, log_size=LOG_SIZE):
+        self.log_size = log_size
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=2000")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " channel_id INTEGER NOT NULL,"
+            " message_id INTEGER UNIQUE,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " ts REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id, seq)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS autoreplies ("
+            " persona TEXT NOT NULL,"
+            " channel_id INTEGER NOT NULL,"
+            " ts REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS autoreplies_channel ON autoreplies (persona, channel_id, ts)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " channel_id INTEGER PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " through REAL NOT NULL)"
+        )
+        self._appends = {}  # channel_id -> appends since last prune
+        self._autoreplies = 0
+
+    def append(self, channel_id, role, content, ts=None, message_id=None):
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO messages (channel_id, message_id, role, content, ts) VALUES (?, ?, ?, ?, ?)",
+            (channel_id, message_id, role, content, ts or time.time()),
+        )
+        if cur.rowcount == 0:
+            return False
+        n = self._appends.get(channel_id, 0) + 1
+        if n >= self.log_size:
+            self._prune(channel_id)
+            n = 0
+        self._appends[channel_id] = n
+        return True
+
+    def _prune(self, channel_id):
+        # bounded compaction: at most log_size rows per call, keeps the newest log_size
+        self.db.execute(
+            "DELETE FROM messages WHERE channel_id = ? AND seq <= ("
+            " SELECT seq FROM messages WHERE channel_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+            (channel_id, channel_id, self.log_size),
+        )
+
+    def recent(self, channel_id, n):
+        rows = self.db.execute(
+            "SELECT role, content, ts FROM messages WHERE channel_id = ? ORDER BY seq DESC LIMIT ?",
+            (channel_id, n),
+        ).fetchall()
+        return [Entry(role, content, ts) for role, content, ts in reversed(rows)]
+
+    def record_autoreply(self, persona, channel_id, ts):
+        self.db.execute("INSERT INTO autoreplies (persona, channel_id, ts) VALUES (?, ?, ?)",
+                        (persona, channel_id, ts))
+        self._autoreplies += 1
+        if self._autoreplies % 200 == 0:
+            self.db.execute("DELETE FROM autoreplies WHERE ts < ?", (ts - AUTOREPLY_RETENTION,))
+
+    def autoreply_times(self, persona, channel_id, since):
+        rows = self.db.execute(
+            "SELECT ts FROM autoreplies WHERE persona = ? AND channel_id = ? AND ts >= ? ORDER BY ts",
+            (persona, channel_id, since),
+        ).fetchall()
+        return [ts for ts, in rows]
+
+    def summary(self, channel_id):
+        # (text, through) or None
+        return self.db.execute("SELECT text, through FROM summaries WHERE channel_id = ?",
+                               (channel_id,)).fetchone()
+
+    def save_summary(self, channel_id, text, through):
+        self.db.execute("INSERT OR REPLACE INTO summaries (channel_id, text, through) VALUES (?, ?, ?)",
+                        (channel_id, text, through))
+
+    def close(self):
+        self.db.close()
+
+
+class PersistentStore(MemoryStore):
+    def __init__(self, path, log_size=LOG_SIZE):
+        super().__init__(log_size)
+        self.disk = SQLiteStore(path, log_size)
+
+    def _load(self, channel_id):
+        # first access since start (or since LRU eviction): read the window back from disk
+        if channel_id not in self.history:
+            for e in self.disk.recent(channel_id, self.log_size):
+                self.history.append(channel_id, e.role, e.content, e.ts)
+
+    def append(self, channel_id, role, content, ts=None, message_id=None):
+        self._load(channel_id)
+        ts = ts or time.time()
+        if message_id is not None and message_id in self._seen:
+            return False
+        # after a restart _seen is empty but the disk (and the window _load read back
+        # from it) already has the message; processes sharing one file use SQLiteStore
+        if not self.disk.append(channel_id, role, content, ts, message_id):
+            return False
+        return super().append(channel_id, role, content, ts, message_id)
+
+    def recent(self, channel_id, n):
+        self._load(channel_id)
+        return super().recent(channel_id, n)
+
+    def record_autoreply(self, persona, channel_id, ts):
+        self.disk.record_autoreply(persona, channel_id, ts)
+
+    def autoreply_times(self, persona, channel_id, since):
+        return self.disk.autoreply_times(persona, channel_id, since)
+
+    def summary(self, channel_id):
+        return self.disk.summary(channel_id)
+
+    def save_summary(self, channel_id, text, through):
+        self.disk.save_summary(channel_id, text, through)
+
+    def close(self):
+        self.disk.close()
+
+
+class ShardedStore:
+    # one store per guild shard: a worker only holds its own shards' channels,
+    # and each shard's database file moves with the shard if workers are rearranged
+    def __init__(self, stores, shard_of):
+        self.stores = stores      # shard id -> store
+        self.shard_of = shard_of  # channel_id -> shard id
+        self._default = stores[min(stores)]
+
+    def _store(self, channel_id):
+        return self.stores.get(self.shard_of(channel_id), self._default)
+
+    def append(self, channel_id, role, content, ts=None, message_id=None):
+        return self._store(channel_id).append(channel_id, role, content, ts, message_id)
+
+    def recent(self, channel_id, n):
+        return self._store(channel_id).recent(channel_id, n)
+
+    def record_autoreply(self, persona, channel_id, ts):
+        self._store(channel_id).record_autoreply(persona, channel_id, ts)
+
+    def autoreply_times(self, persona, channel_id, since):
+        return self._store(channel_id).autoreply_times(persona, channel_id, since)
+
+    def summary(self, channel_id):
+        return self._store(channel_id).summary(channel_id)
+
+    def save_summary(self, channel_id, text, through):
+        self._store(channel_id).save_summary(channel_id, text, through)
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+
+
+def shard_path(path, shard_id):
+    # /data/log.db -> /data/log.shard3.db
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
+
+
+def _open(path):
+    if not path:
+        return MemoryStore()
+    if os.getenv("CONVERSATION_STORE") == "sqlite":
+        return SQLiteStore(path)
+    return PersistentStore(path)
+
+
+def open_store(shard_ids=None, shard_of=None):
+    # CONVERSATION_DB=/path/to/log.db keeps history and rate limits across restarts.
+    # CONVERSATION_STORE=sqlite serves reads straight from the database instead of memory.
+    # With shard_ids, each shard gets its own store (and file), routed by shard_of(channel_id).
+    path = os.getenv("CONVERSATION_DB")
+    if not shard_ids:
+        return _open(path)
+    return ShardedStore({s: _open(path and shard_path(path, s)) for s in shard_ids}, shard_of)
@@ -0,0 +1,76 @@
+# streaming.py
+# Post-and-edit delivery of a reply while Gemini is still generating it.
+# The first text is posted as soon as it arrives; later text is folded in by
+# editing that message at most once per EDIT_INTERVAL (Discord allows roughly
+# five edits per five seconds per channel). Text past Discord's 2000-char
+# limit continues in follow-up messages. New messages go out through `send`
+# (the runtime's outbox when it has one); edits go straight to the message.
+import time
+
+DISCORD_LIMIT = 2000
+EDIT_INTERVAL = 1.2   # seconds between edits of the same message
+
+
+def chunk_text(chunk):
+    # .text raises when a chunk has no text parts (e.g. only finish/usage data)
+    try:
+        return chunk.text or ""
+    except (AttributeError, ValueError):
+        return ""
+
+
+def split_point(text, limit):
+    # prefer breaking at a newline, then a space, in the back half of the window
+    for sep in ("\n", " ", "。"):
+        cut = text.rfind(sep, limit // 2, limit)
+        if cut != -1:
+            return cut + 1
+    return limit
+
+
+class StreamingMessage:
+    def __init__(self, channel, header="", limit=DISCORD_LIMIT, interval=EDIT_INTERVAL, send=None):
+        self.channel = channel
+        self.send = send or channel.send
+        self.header = header      # prepended to the first message only
+        self.limit = limit
+        self.interval = interval
+        self.messages = []        # discord messages posted so far
+        self.text = ""            # full reply text received so far
+        self._offset = 0          # start of the current message's text within self.text
+        self._current = None      # message being edited
+        self._shown = ""          # its last posted content
+        self._last_edit = 0.0
+
+    async def feed(self, text):
+        self.text += text
+        if self._current is None or time.monotonic() - self._last_edit >= self.interval:
+            await self._flush()
+
+    async def finish(self):
+        await self._flush()
+        return self.text.strip()
+
+    async def _flush(self):
+        while True:
+            head = self.header if self._offset == 0 else ""
+            body = self.text[self._offset:]
+            room = self.limit - len(head)
+            if len(body) <= room:
+                if body.strip():
+                    await self._show(head + body)
+                return
+            # current message is full: finalize it and continue in a new one
+            cut = split_point(body, room)
+            await self._show(head + body[:cut])
+            self._offset += cut
+            self._current = None
+
+    async def _show(self, content):
+        if self._current is None:
+            self._current = await self.send(content)
+            self.messages.append(self._current)
+        elif content != self._shown:
+            await self._current.edit(content=content)
+        self._shown = content
+        self._last_edit = time.monotonic()
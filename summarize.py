@@ -0,0 +1,142 @@
+# summarize.py
+# Rolling per-channel summary. Once a channel has SUMMARY_BATCH entries older
+# than its raw tail (the last SUMMARY_TAIL entries) that the summary does not
+# cover yet, a background worker folds them into the summary with one small
+# Gemini call at SUMMARY quota priority. Prompts then carry the summary plus
+# only the entries after it, so long discussions fit a bounded prompt.
+# Summaries are kept in memory (LRU) and written through the store, so they
+# survive restarts with CONVERSATION_DB. Folds run on their own generator
+# (one call at a time over the shared model), never in a persona's slots.
+import asyncio
+from collections import OrderedDict
+
+from generation import AsyncGenerator
+from metrics import METRICS
+from prompt import estimate_tokens, render
+from quota import SUMMARY
+from resilience import DEADLINE, is_degraded
+from store import LOG_SIZE
+
+SUMMARY_TAIL = 6          # newest entries always left raw
+SUMMARY_BATCH = 8         # unsummarized entries beyond the tail that trigger a fold
+SUMMARY_CHARS = 600       # target summary length
+MAX_SUMMARIES = 10000     # channels whose summary is kept in memory
+SUMMARY_PROMPT = (
+    "あなたはDiscordチャンネルの議事録係です。これまでの要約と、その後の発言を読み、"
+    f"要約を更新してください。誰が何を主張したか、決まったこと、未解決の論点を残し、{SUMMARY_CHARS}字以内の"
+    "日本語の地の文で書いてください。要約本文だけを出力してください。\n"
+)
+
+
+class Summary:
+    __slots__ = ("text", "through", "tokens")
+
+    def __init__(self, text, through):
+        self.text = text
+        self.through = through   # ts of the newest entry folded in
+        self.tokens = estimate_tokens(text)
+
+
+class Summarizer:
+    def __init__(self, runtime, tail=SUMMARY_TAIL, batch=SUMMARY_BATCH):
+        self.runtime = runtime
+        self.tail = tail
+        self.batch = batch
+        self._summaries = OrderedDict()  # channel_id -> Summary, or None when there is none yet
+        self._queued = OrderedDict()     # channel_id -> None, channels waiting for a fold
+        self._worker = None
+        self._generator = None   # AsyncGenerator(concurrency=1), made with the first fold
+        self.stats = {"folds": 0, "folded_entries": 0, "failures": 0}
+
+    def get(self, channel_id):
+        if channel_id in self._summaries:
+            self._summaries.move_to_end(channel_id)
+            return self._summaries[channel_id]
+        saved = self.runtime.store.summary(channel_id)
+        summary = Summary(*saved) if saved else None
+        self._remember(channel_id, summary)
+        return summary
+
+    def _remember(self, channel_id, summary):
+        self._summaries[channel_id] = summary
+        self._summaries.move_to_end(channel_id)
+        while len(self._summaries) > MAX_SUMMARIES:
+            self._summaries.popitem(last=False)
+
+    def note(self, channel_id):
+        # called after every logged message; O(1) unless a fold is due
+        if channel_id in self._queued:
+            return
+        n = self.tail + self.batch
+        view = self.runtime.recent(channel_id, n)
+        if len(view) < n:
+            return
+        summary = self.get(channel_id)
+        if summary is not None and view[0].ts <= summary.through:
+            return
+        self._queued[channel_id] = None
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def pending(self):
+        return len(self._queued)
+
+    async def _run(self):
+        # one fold at a time: summaries are background work and must not crowd out replies
+        while self._queued:
+            channel_id = next(iter(self._queued))
+            try:
+                with METRICS.timer("summary_fold_seconds"):
+                    await self.fold(channel_id)
+            except Exception as e:
+                self.stats["failures"] += 1
+                METRICS.inc("summary_failures_total", error=type(e).__name__)
+                print(f"Summary failed for channel {channel_id}: {type(e).__name__}: {e}")
+            finally:
+                self._queued.pop(channel_id, None)
+
+    def pick(self, channel_id):
+        # the entries to fold: unsummarized and older than the raw tail
+        summary = self.get(channel_id)
+        after = summary.through if summary is not None else float("-inf")
+        entries = [e for e in self.runtime.recent(channel_id, LOG_SIZE) if e.ts > after]
+        return summary, entries[:-self.tail] if len(entries) > self.tail else []
+
+    async def fold(self, channel_id):
+        summary, entries = self.pick(channel_id)
+        if len(entries) < self.batch:
+            return
+        bots = self.runtime.bots
+        breaker = self.runtime.breaker
+        if not bots or not breaker.allow(SUMMARY):
+            return  # picked up again by the next note() once the API recovers
+        parts = [SUMMARY_PROMPT]
+        if summary is not None:
+            parts += ["\nこれまでの要約:\n", summary.text, "\n"]
+        parts += ["\nその後の発言:\n", *map(render, entries)]
+        prompt = "".join(parts)
+        if self._generator is None:
+            self._generator = AsyncGenerator(bots[0].generator.model, concurrency=1, timeout=DEADLINE[SUMMARY])
+        quota = self.runtime.quota
+        charged = await quota.acquire(SUMMARY, estimate_tokens(prompt))
+        try:
+            resp = await self._generator.generate(prompt)
+        except Exception as e:
+            breaker.record(not is_degraded(e))
+            raise
+        breaker.record(True)
+        quota.settle(charged, resp)
+        text = (getattr(resp, "text", "") or "").strip()
+        if not text:
+            raise ValueError("empty summary")
+        new = Summary(text[:SUMMARY_CHARS * 2], entries[-1].ts)
+        self._remember(channel_id, new)
+        self.runtime.store.save_summary(channel_id, new.text, new.through)
+        self.stats["folds"] += 1
+        self.stats["folded_entries"] += len(entries)
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        if self._generator is not None:
+            self._generator.cancel_all()
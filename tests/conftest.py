@@ -0,0 +1,27 @@
+# Offline tests: fakes.py stands in for Discord and Gemini, no credentials needed.
+#   python -m pytest -q
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the stub model has no real quota; keep the local limiter out of the way (as loadtest.py does)
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def make_runtime():
+    # Runtime with one fake-gateway client per persona, as loadtest.py builds it
+    import runtime
+    from generation import AsyncGenerator
+    from pernona import PERSONAS
+
+    def make(gateway, model, roles=None, store=None):
+        rt = runtime.Runtime([PERSONAS[r] for r in roles or PERSONAS], store=store)
+        for persona in rt.personas:
+            client = gateway.client(persona.name)
+            rt.bots.append(runtime.PersonaBot(rt, persona, None, AsyncGenerator(model), None, client=client))
+        return rt
+    return make
@@ -0,0 +1,46 @@
+import json
+
+import replay
+from activity import COOLDOWN_MAX, PROB_MAX, ActivityModel
+from pernona import PERSONAS
+
+ENGINEER = PERSONAS["engineer"]
+
+
+def test_first_message_in_quiet_channel_is_not_read_as_busy():
+    model = ActivityModel(budget=5)
+    model.observe(1, "user", False, 1000.0)
+    assert model.channel(1).rate(1000.0) < 1.0
+    assert model.reply_prob(0.3, 1, 1000.0) >= 0.3
+    assert model.cooldown(ENGINEER, 1, 1000.0) <= ENGINEER.cooldown
+
+
+def test_first_autoreply_does_not_pull_the_budget_factor_down():
+    model = ActivityModel(budget=5)
+    model.spend(1000.0)
+    assert model.scale >= 1.0
+
+
+def test_busy_channel_gets_lower_probability_and_longer_cooldown():
+    model = ActivityModel(budget=5)
+    for i in range(600):  # 30 messages a minute for 20 minutes
+        model.observe(1, f"user{i % 5}", False, 1000.0 + 2 * i)
+    now = 1000.0 + 1200
+    assert model.reply_prob(0.3, 1, now) < 0.3
+    assert ENGINEER.cooldown < model.cooldown(ENGINEER, 1, now) <= ENGINEER.cooldown * COOLDOWN_MAX
+
+
+def test_reply_prob_is_capped():
+    model = ActivityModel(budget=5)
+    model.observe(1, "user", False, 1000.0)
+    assert model.reply_prob(1.0, 1, 1000.0) == PROB_MAX
+
+
+def test_replay_answers_first_messages_more_often_than_fixed_policy(tmp_path):
+    # one message in each of many channels, as after a restart: every channel is new to the model
+    trace = tmp_path / "trace.jsonl"
+    trace.write_text("".join(json.dumps({"ts": 60.0 * i, "channel": i, "author": "user", "persona": None}) + "\n"
+                             for i in range(60)), encoding="utf-8")
+    report = replay.run(replay.parse_args(["--trace", str(trace), "--budget", "5", "--personas", "engineer"]))
+    assert report["human_messages"] == 60
+    assert report["adaptive"]["channels_replied"] > report["fixed"]["channels_replied"]
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from arbiter import TurnArbiter, _norm
+from pernona import Persona
+
+
+def persona(traits):
+    return Persona("テストさん", "test", traits)
+
+
+@pytest.mark.parametrize("text, score", [
+    ("I said I would build a guide", 0),   # "ai" and "ui" inside words
+    ("the rapid release", 0),              # "api" inside a word
+    ("AI will change UI design", 2),
+    ("AIについて教えて", 1),                # kana right after an ASCII trait
+    ("ＡＰＩの設計", 1),                    # full-width, normalized
+    ("api, api and more api", 1),          # a trait counts once
+])
+def test_ascii_traits_match_whole_words(text, score):
+    assert TurnArbiter().relevance(persona(["AI", "UI", "API"]), _norm(text)) == score
+
+
+def test_cjk_traits_match_as_substrings():
+    p = persona(["設計", "プログラミング"])
+    assert TurnArbiter().relevance(p, _norm("システム設計とプログラミングの話")) == 2
+    assert TurnArbiter().relevance(p, _norm("今日は晴れ")) == 0
+
+
+def test_relevant_persona_gets_the_turn():
+    class Bot:
+        def __init__(self, p):
+            self.persona = p
+
+    plain = Bot(Persona("A", "a", ["料理"], base_prob=1.0))
+    expert = Bot(Persona("B", "b", ["AI"], base_prob=1.0))
+    arbiter = TurnArbiter(1, random.Random(1))
+    assert arbiter.choose("AIの話をしよう", [plain, expert], 0, lambda bot: False) == {expert}
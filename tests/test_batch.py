@@ -0,0 +1,27 @@
+from batch import parse_replies
+
+ROLES = ["engineer", "designer"]
+
+
+def test_parse_replies_reads_json():
+    text = '{"replies": [{"persona": "designer", "text": " 色 "}, {"persona": "engineer", "text": "API"}]}'
+    assert list(parse_replies(text, ROLES).items()) == [("designer", "色"), ("engineer", "API")]
+
+
+def test_parse_replies_strips_code_fence():
+    text = '```json\n{"replies": [{"persona": "engineer", "text": "ok"}]}\n```'
+    assert parse_replies(text, ROLES) == {"engineer": "ok"}
+
+
+def test_parse_replies_falls_back_to_empty():
+    # the batcher then generates every persona on its own
+    assert parse_replies("ごめんなさい、JSONは苦手です", ROLES) == {}
+    assert parse_replies("", ROLES) == {}
+    assert parse_replies(None, ROLES) == {}
+    assert parse_replies('{"replies": "none"}', ROLES) == {}
+
+
+def test_parse_replies_drops_invalid_entries():
+    text = ('[{"persona": "engineer", "text": "first"}, {"persona": "engineer", "text": "second"},'
+            ' {"persona": "marketer", "text": "not asked"}, {"persona": "designer", "text": "  "}, "junk"]')
+    assert parse_replies(text, ROLES) == {"engineer": "first"}
@@ -0,0 +1,37 @@
+import asyncio
+import types
+
+from outbox import Outbox
+from quota import AUTOREPLY, MENTION
+
+
+class Channel:
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append(content)
+        return types.SimpleNamespace(id=len(self.sent), content=content)
+
+
+class Bot:
+    def __init__(self, name):
+        self.persona = types.SimpleNamespace(role=name)
+        self.header = f"**[{name}]** "
+
+
+def test_mentions_go_first_and_short_posts_merge():
+    async def run():
+        outbox, channel = Outbox(), Channel()
+        a, b = Bot("a"), Bot("b")
+        return channel, await asyncio.gather(
+            outbox.post(a, channel, "**[a]** one", AUTOREPLY, merge=True),
+            outbox.post(a, channel, "**[a]** two", AUTOREPLY, merge=True),
+            outbox.post(b, channel, "**[b]** hi", MENTION, merge=True),
+        )
+
+    channel, (one, two, hi) = asyncio.run(run())
+    assert channel.sent == ["**[b]** hi", "**[a]** one\ntwo"]
+    assert not one.merged and two.merged and one.message is two.message
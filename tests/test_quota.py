@@ -0,0 +1,21 @@
+import asyncio
+import time
+
+from quota import AUTOREPLY, INITIATOR, MENTION, SUMMARY, QuotaManager
+
+
+def test_waiters_are_granted_in_priority_order():
+    async def run():
+        quota = QuotaManager(requests_per_min=600, tokens_per_min=10 ** 9)
+        quota.requests.take(quota.requests.capacity, time.monotonic())  # empty: everyone queues
+        granted = []
+
+        async def ask(priority):
+            await quota.acquire(priority, 10)
+            granted.append(priority)
+
+        # queued lowest priority first
+        await asyncio.gather(*(ask(p) for p in (SUMMARY, INITIATOR, AUTOREPLY, MENTION)))
+        return granted
+
+    assert asyncio.run(run()) == [MENTION, AUTOREPLY, INITIATOR, SUMMARY]
@@ -0,0 +1,16 @@
+from quota import AUTOREPLY, MENTION
+from resilience import BREAKER_MIN_CALLS, CircuitBreaker
+
+
+def test_breaker_opens_for_autonomous_traffic_only():
+    breaker = CircuitBreaker()
+    for _ in range(BREAKER_MIN_CALLS):
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(AUTOREPLY)
+    assert breaker.allow(MENTION)
+
+    breaker.open_until = 0  # cooldown over: one probe, whose success closes it
+    assert breaker.allow(AUTOREPLY)
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,80 @@
+import asyncio
+import functools
+
+import pytest
+
+import coalesce
+import loadtest
+import runtime
+from fakes import FakeGateway, FakeMessage, FakeUser, StubModel
+from store import PersistentStore
+
+# gaps between messages mostly longer than the window but shorter than a generation
+BUSY = "--guilds 1 --channels 1 --rate 4 --latency 0.3 --sigma 0.2 --mention-rate 0.4 --duration 4 --drain 1.5 --no-memory"
+MAX_WAIT = 1.0
+
+
+@pytest.mark.parametrize("window, bound", [(0, 1.5), (0.15, MAX_WAIT + 1.5)])
+def test_mentions_in_busy_channel_are_answered(monkeypatch, window, bound):
+    # user-008: new input used to cancel and restart mention replies until traffic stopped.
+    # The bounds are loose; a starved mention waits for the end of traffic (up to --duration).
+    monkeypatch.setattr(runtime, "COALESCE", window)
+    monkeypatch.setattr(runtime, "Coalescer", functools.partial(coalesce.Coalescer, max_wait=MAX_WAIT))
+    report = asyncio.run(loadtest.run_load(loadtest.parse_args(BUSY.split())))
+    assert report["mention_latency_s"]["n"] > 0
+    assert loadtest.check(report, bound) == []
+
+
+def test_each_message_logged_once(monkeypatch, tmp_path, make_runtime):
+    # every persona client receives every message, and our own replies echo back
+    monkeypatch.setattr(runtime, "SEND_QUEUE", "off")
+    gateway = FakeGateway(guilds=1, channels=2)
+    store = PersistentStore(str(tmp_path / "log.db"))
+    rt = make_runtime(gateway, StubModel(latency=0.01, sigma=0, seed=1), store=store)
+    users = [FakeUser(f"user{i}") for i in range(3)]
+    bots = list(gateway.users.values())
+    said = {channel_id: [] for channel_id in gateway.channels}
+
+    async def drive():
+        for i in range(12):
+            channel = list(gateway.channels.values())[i % 2]
+            mentions = [bots[i % len(bots)]] if i % 3 == 0 else []
+            said[channel.id].append(f"message {i}")
+            gateway.dispatch(FakeMessage(channel, users[i % 3], f"message {i}", mentions))
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(1.0)
+        for bot in rt.bots:
+            bot.generator.cancel_all()
+
+    asyncio.run(drive())
+    for channel in gateway.channels.values():
+        logged = rt.store.recent(channel.id, 60)
+        posted = [m for m in channel.sent if m.author is not None and m.author.bot]
+        assert posted
+        assert [e.content for e in logged if e.role == runtime.USER_ROLE] == said[channel.id]
+        assert len([e for e in logged if e.role != runtime.USER_ROLE]) == len(posted)
+        assert len(store.disk.recent(channel.id, 60)) == len(logged)
+    store.close()
+
+
+def test_batch_falls_back_when_reply_does_not_parse(monkeypatch, make_runtime):
+    class ProseModel(StubModel):
+        def _outcome(self, prompt):
+            text, tokens = super()._outcome(prompt)
+            return (text if not text.startswith("{") else "ごめんなさい、JSONは苦手です"), tokens
+
+    monkeypatch.setattr(runtime, "BATCH_REPLIES", "on")
+    monkeypatch.setattr(runtime, "SEND_QUEUE", "off")
+    gateway = FakeGateway(guilds=1, channels=1)
+    rt = make_runtime(gateway, ProseModel(latency=0.01, sigma=0, seed=1), roles=["engineer", "designer"])
+    channel = next(iter(gateway.channels.values()))
+
+    async def drive():
+        gateway.dispatch(FakeMessage(channel, FakeUser("user"), "どう思う?", list(gateway.users.values())))
+        await asyncio.sleep(1.0)
+
+    asyncio.run(drive())
+    assert rt.batcher.stats["parse_failures"] == 1
+    assert rt.batcher.stats["fallbacks"] == 2
+    senders = {m.author.name for m in channel.sent if m.author is not None and m.author.bot}
+    assert senders == {"エンジニアさん", "デザイナーさん"}
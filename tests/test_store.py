@@ -0,0 +1,41 @@
+import sqlite3
+
+from history import HistoryBook
+from store import LOG_SIZE, PersistentStore, SQLiteStore
+
+
+def test_ring_buffer_keeps_newest_entries():
+    book = HistoryBook(5)
+    for i in range(12):
+        book.append(1, "u", f"m{i}", ts=i)
+    assert [e.content for e in book.window(1, 5)] == [f"m{i}" for i in range(7, 12)]
+    assert [e.content for e in book.window(1, 2)] == ["m10", "m11"]
+
+
+def test_sqlite_compaction_keeps_log_size_rows(tmp_path):
+    path = str(tmp_path / "log.db")
+    store = SQLiteStore(path)
+    for i in range(3 * LOG_SIZE):
+        store.append(1, "u", f"m{i}", ts=i)
+    for i in range(10):
+        store.append(2, "u", f"other{i}", ts=i)
+    store.close()
+
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT content FROM messages WHERE channel_id = 1 ORDER BY seq").fetchall()
+    assert [r for r, in rows] == [f"m{i}" for i in range(2 * LOG_SIZE, 3 * LOG_SIZE)]
+    assert db.execute("SELECT COUNT(*) FROM messages WHERE channel_id = 2").fetchone() == (10,)
+    db.close()
+
+
+def test_persistent_store_skips_duplicates_after_restart(tmp_path):
+    path = str(tmp_path / "log.db")
+    store = PersistentStore(path)
+    assert store.append(1, "u", "hello", message_id=42)
+    assert not store.append(1, "u", "hello", message_id=42)
+    store.close()
+
+    store = PersistentStore(path)  # fresh process: in-memory ids are gone
+    assert not store.append(1, "u", "hello", message_id=42)
+    assert [e.content for e in store.recent(1, LOG_SIZE)] == ["hello"]
+    store.close()